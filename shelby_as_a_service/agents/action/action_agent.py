@@ -100,6 +100,87 @@ class ActionAgent(AgentBase):
 
         return answer
 
+    def multi_boolean_classifier(
+        self,
+        features: list[str],
+        user_input: Optional[str] = None,
+        prompt_string: Optional[str] = None,
+        prompt_template_path: Optional[str] = None,
+        retry_after_fail_n_times: int = 3,
+        consensus_after_n_tries: int = 1,
+    ) -> list[bool]:
+        """Classifies every feature in one request, with a majority vote per feature."""
+        if not features:
+            return []
+        separator = "\n"
+        (
+            logit_bias,
+            logit_bias_response_tokens,
+        ) = classifier.create_multi_boolean_classifier_logit_bias(
+            number_of_features=len(features),
+            llm_model_name=self.llm_service.llm_provider.llm_model_instance.MODEL_NAME,
+            separator=separator,
+        )
+        system_prompt_string, user_input_string = classifier.create_multi_boolean_classifier_prompt(
+            features=features,
+            user_input=user_input,
+            prompt_string=prompt_string,
+            prompt_template_path=prompt_template_path,
+            separator=separator,
+        )
+        prompt = self.create_prompt(
+            user_input=user_input_string,
+            llm_provider_name=self.llm_service.llm_provider.CLASS_NAME,  # type: ignore
+            prompt_string=system_prompt_string,
+        )
+
+        # This needs to be an odd number so that there is always a majority vote.
+        if consensus_after_n_tries > 1 and consensus_after_n_tries % 2 == 0:
+            consensus_after_n_tries += 1
+
+        fail_count = 0
+        results: list[list[bool]] = []
+        while len(results) < consensus_after_n_tries:
+            responses = self.llm_service.make_decision(
+                prompt=prompt,
+                logit_bias=logit_bias,
+                logit_bias_response_tokens=logit_bias_response_tokens,
+                consensus_after_n_tries=consensus_after_n_tries - len(results),
+            )
+            if not isinstance(responses, list):
+                responses = [responses]
+            failed_last = False
+            for resp in responses:
+                try:
+                    results.append(
+                        classifier.multi_boolean_classifier_response_parser(
+                            response=resp, number_of_features=len(features), separator=separator
+                        )
+                    )
+                except ValueError:
+                    failed_last = True
+            if failed_last:
+                fail_count += 1
+                if fail_count >= retry_after_fail_n_times:
+                    self.log.info(
+                        f"Failed to get a valid response from {self.llm_service.llm_provider.CLASS_NAME} after {fail_count} retries."
+                    )
+                    break
+
+        if not results:
+            raise ValueError("No results found.")
+
+        answers = []
+        for feature_results in zip(*results):
+            answer, log_string = classifier.parse_results(
+                results=list(feature_results), options=[True, False]
+            )
+            if not isinstance(answer, bool):
+                raise ValueError("answer should be a boolean.")
+            answers.append(answer)
+        self.log.info(f"Results: {sum(answers)} of {len(answers)} true")
+        return answers
+
     # def action_prompt_template(self, query):
     #     # Chooses workflow
     #     # Currently disabled
@@ -3,6 +3,7 @@ from typing import Literal, Type
 from context_index.doc_index.doc_index_models import (
     ChunkModel,
     DocDBModel,
+    DocDBWriteLedgerModel,
     DocEmbeddingModel,
     DocIndexModel,
     DocIndexTemplateModel,
@@ -24,6 +25,7 @@ DOC_INDEX_MODEL_NAMES = Literal[
     DocEmbeddingModel.class_name,
     ChunkModel.class_name,
     DocumentModel.class_name,
+    DocDBWriteLedgerModel.class_name,
 ]
 DOC_INDEX_MODELS: list[Type] = [
     DocDBModel,
@@ -36,4 +38,5 @@ DOC_INDEX_MODELS: list[Type] = [
     DocEmbeddingModel,
     ChunkModel,
     DocumentModel,
+    DocDBWriteLedgerModel,
 ]
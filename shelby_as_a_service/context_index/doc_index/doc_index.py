@@ -23,6 +23,8 @@ class DocIndex(DocIndexBase):
     def __init__(self) -> None:
         self.log = logging.getLogger(__name__)
         self.setup_index()
+        self.migrate_pickled_chunk_embeddings()
+        self.backfill_chunk_indexes()
         self.setup_doc_index()
 
     def setup_doc_index(self):
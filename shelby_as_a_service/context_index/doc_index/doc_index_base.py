@@ -1,12 +1,17 @@
+import pickle
 from typing import Any, Optional
 
 import context_index.doc_index as doc_index_models
+from context_index.doc_index.docs.retrieval_cache import SemanticRetrievalCache
+from context_index.embedding_blob import EMBEDDING_MAGIC, encode_embedding
 from context_index.index_base import IndexBase
 from services.database.database_service import DatabaseService
 from services.document_loading.document_loading_service import DocLoadingService
+from services.service_pool import ServicePool
 from services.text_processing.ingest_processing.ingest_processing_service import (
     IngestProcessingService,
 )
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 
@@ -16,6 +21,89 @@ class DocIndexBase(IndexBase):
     write_session: Optional[Session] = None
     context_template: doc_index_models.DocIndexTemplateModel
 
+    EMBEDDING_MIGRATION_BATCH_SIZE: int = 500
+    # One time migrations are recorded as bits of SQLite's user_version so startup skips them
+    MIGRATION_PICKLED_CHUNK_EMBEDDINGS: int = 1
+    MIGRATION_CHUNK_INDEXES: int = 2
+
+    @classmethod
+    def get_completed_migrations(cls) -> int:
+        with cls.engine.connect() as connection:
+            return connection.execute(text("PRAGMA user_version")).scalar() or 0
+
+    @classmethod
+    def mark_migration_completed(cls, migration: int):
+        with cls.engine.begin() as connection:
+            completed = connection.execute(text("PRAGMA user_version")).scalar() or 0
+            connection.execute(text(f"PRAGMA user_version = {int(completed) | migration}"))
+
+    @classmethod
+    def migrate_pickled_chunk_embeddings(cls):
+        """One time rewrite of chunk embeddings stored by PickleType into embedding blobs."""
+        if cls.get_completed_migrations() & cls.MIGRATION_PICKLED_CHUNK_EMBEDDINGS:
+            return
+        chunks_table = doc_index_models.ChunkModel.__tablename__
+        migrated_count = 0
+        last_id = 0
+        while True:
+            with cls.engine.begin() as connection:
+                rows = connection.execute(
+                    text(
+                        f"SELECT id, chunk_embedding FROM {chunks_table} "
+                        "WHERE id > :last_id AND chunk_embedding IS NOT NULL "
+                        "AND substr(chunk_embedding, 1, :magic_length) != :magic "
+                        "ORDER BY id LIMIT :batch_size"
+                    ),
+                    {
+                        "last_id": last_id,
+                        "magic_length": len(EMBEDDING_MAGIC),
+                        "magic": EMBEDDING_MAGIC,
+                        "batch_size": cls.EMBEDDING_MIGRATION_BATCH_SIZE,
+                    },
+                ).fetchall()
+                if not rows:
+                    break
+                connection.execute(
+                    text(f"UPDATE {chunks_table} SET chunk_embedding = :blob WHERE id = :id"),
+                    [
+                        {"id": row_id, "blob": encode_embedding(pickle.loads(blob))}
+                        for row_id, blob in rows
+                    ],
+                )
+            last_id = rows[-1][0]
+            migrated_count += len(rows)
+
+        if migrated_count:
+            # Pages freed by the smaller rows are only returned to the filesystem by VACUUM
+            with cls.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                connection.execute(text("VACUUM"))
+            cls.log.info(f"Migrated {migrated_count} pickled chunk embeddings to blobs")
+        cls.mark_migration_completed(cls.MIGRATION_PICKLED_CHUNK_EMBEDDINGS)
+
+    @classmethod
+    def backfill_chunk_indexes(cls):
+        """
+        Sets chunk_index on chunks ingested before it was stored.
+        Chunks are inserted in document order, so their ids give the order within a document.
+        """
+        if cls.get_completed_migrations() & cls.MIGRATION_CHUNK_INDEXES:
+            return
+        chunks_table = doc_index_models.ChunkModel.__tablename__
+        with cls.engine.begin() as connection:
+            result = connection.execute(
+                text(
+                    f"UPDATE {chunks_table} SET chunk_index = ordered.chunk_index "
+                    "FROM (SELECT id, ROW_NUMBER() OVER "
+                    "(PARTITION BY document_id ORDER BY id) - 1 AS chunk_index "
+                    f"FROM {chunks_table} WHERE document_id IN "
+                    f"(SELECT document_id FROM {chunks_table} WHERE chunk_index IS NULL)) AS ordered "
+                    f"WHERE {chunks_table}.id = ordered.id"
+                )
+            )
+        if result.rowcount:
+            cls.log.info(f"Backfilled chunk_index for {result.rowcount} chunks")
+        cls.mark_migration_completed(cls.MIGRATION_CHUNK_INDEXES)
+
     @staticmethod
     def open_session():
         DocIndexBase.session = IndexBase.indexbase_open_session(
@@ -29,6 +117,9 @@ class DocIndexBase(IndexBase):
     @staticmethod
     def commit_session():
         IndexBase.indexbase_commit_session(DocIndexBase.session)
+        # Pooled services and cached retrievals were built from the previous configs
+        ServicePool.invalidate()
+        SemanticRetrievalCache.invalidate()
 
     @staticmethod
     def open_write_session() -> Session:
@@ -1,10 +1,12 @@
 from __future__ import annotations
 
-from datetime import datetime
+import json
+from datetime import datetime, timezone
 from typing import Any, Literal, get_args
 
+from context_index.embedding_blob import EmbeddingBlob
 from context_index.index_base import Base
-from sqlalchemy import JSON, Boolean, DateTime, ForeignKey, Integer, PickleType, String
+from sqlalchemy import JSON, Boolean, DateTime, ForeignKey, Index, Integer, String
 from sqlalchemy.ext.mutable import MutableDict
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -137,16 +139,23 @@ class ChunkModel(Base):
     class_name = Literal["chunks"]
     CLASS_NAME: str = get_args(class_name)[0]
     __tablename__ = CLASS_NAME
+    # Neighbour lookups join on a document's chunk order
+    __table_args__ = (Index("ix_chunks_document_id_chunk_index", "document_id", "chunk_index"),)
     id: Mapped[int] = mapped_column(primary_key=True)
     document_id: Mapped[int] = mapped_column(Integer, ForeignKey("documents.id"), nullable=True)
     document_model: Mapped["DocumentModel"] = relationship(
         "DocumentModel", foreign_keys=[document_id], back_populates="context_chunks"
     )
+    # Position of the chunk in its document, from 0
+    chunk_index: Mapped[int] = mapped_column(Integer, nullable=True)
 
     context_chunk: Mapped[str] = mapped_column(String, nullable=True)
-    chunk_embedding: Mapped[list[float]] = mapped_column(PickleType, nullable=True)
+    # Set dtype to "float16" to halve storage again. Rows of either dtype stay readable.
+    chunk_embedding: Mapped[list[float]] = mapped_column(EmbeddingBlob("float32"), nullable=True)
     chunk_doc_db_id: Mapped[str] = mapped_column(String, nullable=True)
     chunk_doc_db_name: Mapped[str] = mapped_column(String, nullable=True)
+    # Token count of context_chunk per tiktoken encoding name, counted at ingest
+    token_counts: Mapped[dict] = mapped_column(MutableDict.as_mutable(JSON), nullable=True)  # type: ignore
 
     def prepare_upsert_metadata(self) -> dict:
         metadata = {
@@ -158,10 +167,44 @@ class ChunkModel(Base):
             "uri": self.document_model.uri,
             "source_type": self.document_model.source_type,
             "date_of_creation": self.document_model.date_of_creation.strftime("%Y-%m-%d %H:%M:%S"),
+            # Numeric copy so doc dbs can range filter on the date
+            "date_of_creation_timestamp": self.document_model.date_of_creation.replace(
+                tzinfo=timezone.utc
+            ).timestamp(),
         }
+        if self.token_counts:
+            metadata["content_token_counts"] = json.dumps(self.token_counts)
         return metadata
 
 
+class DocDBWriteLedgerModel(Base):
+    class_name = Literal["doc_db_write_ledger"]
+    CLASS_NAME: str = get_args(class_name)[0]
+    __tablename__ = CLASS_NAME
+    # AUTOINCREMENT so ids are never reused. They're used to allocate chunk_doc_db_ids.
+    __table_args__ = {"sqlite_autoincrement": True}
+    id: Mapped[int] = mapped_column(primary_key=True)
+
+    OPERATION_UPSERT: str = "upsert"
+    OPERATION_DELETE: str = "delete"
+    STATUS_PENDING: str = "pending"
+    STATUS_WRITTEN: str = "written"
+    STATUS_VERIFIED: str = "verified"
+    STATUS_FAILED: str = "failed"
+    doc_db_name: Mapped[str] = mapped_column(String)
+    domain_name: Mapped[str] = mapped_column(String)
+    source_name: Mapped[str] = mapped_column(String, nullable=True)
+    operation: Mapped[str] = mapped_column(String)
+    doc_db_id: Mapped[str] = mapped_column(String, nullable=True, index=True)
+    status: Mapped[str] = mapped_column(String, default=STATUS_PENDING, index=True)
+    date_of_creation: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, nullable=False
+    )
+    date_of_last_update: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
+    )
+
+
 class DocumentModel(Base):
     class_name = Literal["documents"]
     CLASS_NAME: str = get_args(class_name)[0]
@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import Any, Optional
 
+import numpy as np
 import services.text_processing.text_utils as text_utils
 from context_index.doc_index.doc_index_models import (
     ChunkModel,
@@ -8,8 +9,11 @@ from context_index.doc_index.doc_index_models import (
     DomainModel,
     SourceModel,
 )
+from context_index.embedding_blob import decode_embedding, decode_embedding_matrix
 from langchain.schema import Document
 from pydantic import BaseModel
+from sqlalchemy import LargeBinary, and_, type_coerce
+from sqlalchemy.orm import Session, aliased
 
 
 class RetrievalDoc(BaseModel):
@@ -73,3 +77,143 @@ class IngestDoc(BaseModel):
             date_of_creation=datetime.now(),
             date_published=datetime.now(),
         )
+
+
+def hydrate_retrieval_docs(
+    session: Session, matches_per_term: list[list[tuple[str, float]]]
+) -> list[list[RetrievalDoc]]:
+    """
+    Builds RetrievalDocs for (chunk_doc_db_id, score) matches from the index.
+    One bulk IN query covers the matches of every term. Ids missing from the index are skipped.
+    """
+    matched_ids = {doc_db_id for matches in matches_per_term for doc_db_id, _ in matches}
+    if not matched_ids:
+        return [[] for _ in matches_per_term]
+    rows = (
+        session.query(
+            ChunkModel.chunk_doc_db_id,
+            ChunkModel.context_chunk,
+            ChunkModel.token_counts,
+            DocumentModel.id,
+            DocumentModel.title,
+            DocumentModel.uri,
+            DocumentModel.source_type,
+            DocumentModel.date_of_creation,
+            SourceModel.name,
+            DomainModel.name,
+        )
+        .join(DocumentModel, ChunkModel.document_id == DocumentModel.id)
+        .join(SourceModel, DocumentModel.source_id == SourceModel.id)
+        .join(DomainModel, SourceModel.domain_id == DomainModel.id)
+        .filter(ChunkModel.chunk_doc_db_id.in_(matched_ids))
+        .all()
+    )
+    rows_by_id = {row[0]: row for row in rows}
+    encoding_name = text_utils.get_encoding_name()
+
+    returned_documents_per_term = []
+    for matches in matches_per_term:
+        returned_documents = []
+        for doc_db_id, score in matches:
+            if (row := rows_by_id.get(doc_db_id)) is None:
+                continue
+            returned_documents.append(
+                RetrievalDoc(
+                    chunk_doc_db_id=doc_db_id,
+                    context_chunk=row[1],
+                    content_token_count=(row[2] or {}).get(encoding_name, 0),
+                    document_id=row[3],
+                    title=row[4],
+                    uri=row[5],
+                    source_type=row[6],
+                    date_of_creation=row[7],
+                    source_name=row[8],
+                    domain_name=row[9],
+                    score=score,
+                )
+            )
+        returned_documents_per_term.append(returned_documents)
+    return returned_documents_per_term
+
+
+def load_chunk_embeddings(
+    session: Session, domain_name: Optional[str] = None, source_name: Optional[str] = None
+) -> tuple[list[str], np.ndarray]:
+    """
+    Loads the chunk embeddings of a domain or source as one contiguous float32 matrix.
+    Returns the chunk_doc_db_ids in row order. The blobs are read raw, skipping the ORM decode.
+    """
+    query = (
+        session.query(
+            ChunkModel.chunk_doc_db_id,
+            type_coerce(ChunkModel.chunk_embedding, LargeBinary),
+        )
+        .join(DocumentModel, ChunkModel.document_id == DocumentModel.id)
+        .join(SourceModel, DocumentModel.source_id == SourceModel.id)
+        .join(DomainModel, SourceModel.domain_id == DomainModel.id)
+        .filter(ChunkModel.chunk_embedding.is_not(None))
+    )
+    if domain_name is not None:
+        query = query.filter(DomainModel.name == domain_name)
+    if source_name is not None:
+        query = query.filter(SourceModel.name == source_name)
+    rows = query.order_by(ChunkModel.id).all()
+    return [row[0] for row in rows], decode_embedding_matrix([row[1] for row in rows])
+
+
+def load_chunk_embeddings_by_ids(
+    session: Session, chunk_doc_db_ids: list[str]
+) -> dict[str, tuple[str, np.ndarray]]:
+    """
+    Loads the stored embeddings of the given chunks in one bulk IN query.
+    Returns chunk_doc_db_id -> (chunk_doc_db_name, embedding). Chunks without embeddings are skipped.
+    """
+    if not chunk_doc_db_ids:
+        return {}
+    rows = (
+        session.query(
+            ChunkModel.chunk_doc_db_id,
+            ChunkModel.chunk_doc_db_name,
+            type_coerce(ChunkModel.chunk_embedding, LargeBinary),
+        )
+        .filter(ChunkModel.chunk_doc_db_id.in_(set(chunk_doc_db_ids)))
+        .filter(ChunkModel.chunk_embedding.is_not(None))
+        .all()
+    )
+    return {row[0]: (row[1], decode_embedding(row[2])) for row in rows}
+
+
+def load_neighbour_chunks(
+    session: Session, chunk_doc_db_ids: list[str], window: int
+) -> dict[str, list[tuple[int, str, Optional[str]]]]:
+    """
+    Loads the chunks within window positions of each given chunk in its document, with one self
+    join. Returns chunk_doc_db_id -> [(chunk_index, context_chunk, chunk_doc_db_id)] in document
+    order, including the chunk itself. Chunks without a chunk_index are skipped.
+    """
+    if not chunk_doc_db_ids:
+        return {}
+    hit = aliased(ChunkModel)
+    rows = (
+        session.query(
+            hit.chunk_doc_db_id,
+            ChunkModel.chunk_index,
+            ChunkModel.context_chunk,
+            ChunkModel.chunk_doc_db_id,
+        )
+        .join(
+            ChunkModel,
+            and_(
+                ChunkModel.document_id == hit.document_id,
+                ChunkModel.chunk_index.between(hit.chunk_index - window, hit.chunk_index + window),
+            ),
+        )
+        .filter(hit.chunk_doc_db_id.in_(set(chunk_doc_db_ids)))
+        .filter(hit.chunk_index.is_not(None))
+        .order_by(hit.chunk_doc_db_id, ChunkModel.chunk_index)
+        .all()
+    )
+    neighbours: dict[str, list[tuple[int, str, Optional[str]]]] = {}
+    for hit_id, chunk_index, context_chunk, chunk_doc_db_id in rows:
+        neighbours.setdefault(hit_id, []).append((chunk_index, context_chunk, chunk_doc_db_id))
+    return neighbours
@@ -2,6 +2,7 @@ from datetime import datetime, timedelta
 
 import context_index.doc_index as doc_index_models
 from context_index.doc_index.doc_index_base import DocIndexBase
+from context_index.doc_index.docs.retrieval_cache import SemanticRetrievalCache
 from services.database.database_service import DatabaseService
 from services.document_loading.document_loading_service import DocLoadingService
 from services.text_processing.ingest_processing.ingest_processing_service import (
@@ -85,10 +86,16 @@ class DocIngest(DocIndexBase):
                     if cls._ingest_source(source=source, session=session):
                         source.date_of_last_successful_update = datetime.utcnow()
                         session.commit()
+                        cls._get_doc_db_service(source=source).persist_failed_ledger_entries()
+                        # Ledger entries are committed so a background pass can check them
+                        cls._get_doc_db_service(source=source).reconcile_write_ledger_in_background(
+                            domain_name=source.domain_model.name, source_name=source.name
+                        )
                         break
                 except Exception as error:
                     cls.log.info(f"An error occurred: {error}")
                     session.rollback()
+                    cls._get_doc_db_service(source=source).persist_failed_ledger_entries()
                     cls.log.info(f"Retrying source. Attempt {i + 1} out of {retry_count}.")
                     if i > retry_count - 1:
                         cls.log.info(f"Skippng source after {i + 1} retries.")
@@ -119,24 +126,44 @@ class DocIngest(DocIndexBase):
         if not upsert_docs:
             raise ValueError(f"Could not process docs from {source.name}")
 
+        doc_db_service = cls._get_doc_db_service(source=source)
+        try:
+            with DatabaseService.index_session(session):
+                doc_db_service.upsert_documents_from_context_index_source(
+                    upsert_docs=upsert_docs,
+                    source=source,
+                    doc_db_ids_requiring_deletion=doc_db_ids_requiring_deletion,
+                )
+                # Never delete what was just upserted
+                upserted_ids = {
+                    chunk.chunk_doc_db_id
+                    for doc in upsert_docs
+                    for chunk in doc.existing_document_model.context_chunks  # type: ignore
+                }
+                doc_db_ids_requiring_deletion = [
+                    doc_db_id
+                    for doc_db_id in doc_db_ids_requiring_deletion
+                    if doc_db_id not in upserted_ids
+                ]
+                if doc_db_ids_requiring_deletion:
+                    doc_db_service.clear_existing_entries_by_id(
+                        domain_name=source.domain_model.name,
+                        doc_db_ids_requiring_deletion=doc_db_ids_requiring_deletion,
+                        source_name=source.name,
+                    )
+        finally:
+            # Even a failed write may have changed what the domain returns
+            SemanticRetrievalCache.invalidate_domains([source.domain_model.name])
+
+        return True
+
+    @classmethod
+    def _get_doc_db_service(cls, source: doc_index_models.SourceModel) -> DatabaseService:
         doc_db_model: doc_index_models.DocDBModel = source.enabled_doc_db
         doc_embedding_model: doc_index_models.DocEmbeddingModel = doc_db_model.enabled_doc_embedder
-        doc_db_service = DatabaseService(
+        return DatabaseService.get_pooled(
             doc_db_provider_name=doc_db_model.name,  # type: ignore
-            doc_db_embedding_provider_name=doc_embedding_model.name,  # type: ignore
-            doc_db_embedding_provider_config=doc_embedding_model.config,
-            context_index_config=doc_db_model.config,
-            session=session,
-        )
-        doc_db_service.upsert_documents_from_context_index_source(
-            upsert_docs=upsert_docs,
-            source=source,
-            doc_db_ids_requiring_deletion=doc_db_ids_requiring_deletion,
+            doc_db_embedding_provider_name=doc_embedding_model.name,
+            doc_db_embedding_provider_config=dict(doc_embedding_model.config),
+            context_index_config=dict(doc_db_model.config),
         )
-        if doc_db_ids_requiring_deletion:
-            doc_db_service.clear_existing_entries_by_id(
-                domain_name=source.domain_model.name,
-                doc_db_ids_requiring_deletion=doc_db_ids_requiring_deletion,
-            )
-
-        return True
@@ -1,18 +1,36 @@
+import heapq
+import json
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import Any, Optional, Type
 
 import context_index.doc_index as doc_index_models
 import gradio as gr
+import numpy as np
 import services.text_processing.prompts.prompt_template_service as prompts
 from agents.action.action_agent import ActionAgent
-from context_index.doc_index.docs.context_docs import RetrievalDoc
+from context_index.doc_index.docs.context_docs import (
+    RetrievalDoc,
+    load_chunk_embeddings_by_ids,
+    load_neighbour_chunks,
+)
+from context_index.doc_index.docs.retrieval_cache import SemanticRetrievalCache
+from context_index.index_base import IndexBase
 from pydantic import BaseModel
 from services.database.database_service import DatabaseService
+from services.database.metadata_filter import MetadataFilter
 from services.gradio_interface.gradio_base import GradioBase
 from services.service_base import ServiceBase
 from services.text_processing.process_retrieval import (
+    expand_docs_with_neighbours,
     preprocess_retrieved_docs,
     process_retrieved_docs,
 )
+from services.text_processing.rerank_retrieval import (
+    drop_duplicate_docs,
+    min_max_normalize,
+    rerank_retrieved_docs,
+    select_docs_mmr,
+)
 
 
 class ClassConfigModel(BaseModel):
@@ -25,6 +43,31 @@ class ClassConfigModel(BaseModel):
     doc_relevancy_check_consensus_after_n_tries: int = 3
     doc_relevancy_check_llm_provider_name: str = "openai_llm"
     doc_relevancy_check_llm_model_name: str = "gpt-3.5-turbo"
+    doc_relevancy_check_mode: str = "sequential"  # "sequential", "concurrent" or "batched"
+    doc_relevancy_check_max_concurrent_requests: int = 4
+    doc_relevancy_check_batch_size: int = 8  # Docs classified per request in batched mode
+    # Docs are accepted or rejected by query similarity, only the band between goes to the LLM.
+    # The thresholds are per embedding model. The defaults assume ada-002 like cosine scores,
+    # which bunch up between 0.7 and 0.9, so retune them before enabling with another embedder.
+    doc_relevancy_prefilter_enabled: bool = False
+    doc_relevancy_prefilter_accept_threshold: float = 0.9
+    doc_relevancy_prefilter_reject_threshold: float = 0.7
+    doc_db_query_max_concurrent_requests: int = 8
+    doc_db_query_timeout_seconds: float = 15.0
+    context_packing_strategy: str = "legacy"  # "legacy", "greedy" or "knapsack"
+    rerank_strategy: str = "none"  # "none", "bm25", "cosine" or "hybrid"
+    rerank_overfetch_multiplier: int = 3  # Fetch this many times retrieve_n_docs to rerank
+    rerank_bm25_weight: float = 0.3  # Share of the hybrid score from BM25
+    duplicate_filter_enabled: bool = True
+    near_duplicate_max_hamming_distance: int = 9  # Of the 64 simhash bits
+    mmr_enabled: bool = False
+    mmr_lambda: float = 0.7  # 1 is pure relevance, 0 pure diversity
+    neighbour_expansion_enabled: bool = False
+    neighbour_expansion_window: int = 1  # Chunks on each side of a retrieved chunk
+    semantic_cache_enabled: bool = False
+    semantic_cache_similarity_threshold: float = 0.95  # Cosine similarity of query embeddings
+    semantic_cache_ttl_seconds: float = 900
+    semantic_cache_max_entries: int = 256
 
 
 class DocRetrieval(ServiceBase):
@@ -54,6 +97,7 @@ class DocRetrieval(ServiceBase):
         doc_relevancy_check_consensus_after_n_tries: Optional[int] = None,
         doc_relevancy_check_llm_provider_name: Optional[str] = None,
         doc_relevancy_check_llm_model_name: Optional[str] = None,
+        filters: Optional[list[MetadataFilter]] = None,
     ) -> list[RetrievalDoc]:
         """
         Retrieves documents based on a query.
@@ -66,6 +110,7 @@ class DocRetrieval(ServiceBase):
             topic_constraint_enabled (bool, optional): Whether to enable topic constraints. Defaults to None.
             keyword_generator_enabled (bool, optional): Whether to enable keyword generation. Defaults to None.
             doc_relevancy_check_enabled (bool, optional): Whether to enable document relevancy check. Defaults to None.
+            filters (list[MetadataFilter], optional): Metadata filters pushed down to the doc_db. Defaults to None.
 
         Returns:
             list[Dict[str, Any]]: A list of parsed documents.
@@ -117,26 +162,56 @@ class DocRetrieval(ServiceBase):
             #     )
             pass
 
-        returned_documents_list: list[RetrievalDoc] = []
-        for domain in domain_models:
-            domain_doc_db_providers: set[doc_index_models.DocDBModel] = set()
-            for source in domain.sources:
-                domain_doc_db_providers.add(source.enabled_doc_db)
-
-            for domain_doc_db_provider in domain_doc_db_providers:
-                returned_documents = DatabaseService(
-                    doc_db_provider_name=domain_doc_db_provider.name,  # type: ignore
-                    context_index_config=domain_doc_db_provider.config,
-                    doc_db_embedding_provider_name=domain_doc_db_provider.enabled_doc_embedder.name,  # type: ignore
-                    doc_db_embedding_provider_config=domain_doc_db_provider.enabled_doc_embedder.config,
-                ).query_by_terms(
-                    search_terms=query,
-                    retrieve_n_docs=retrieve_n_docs,
-                    domain_name=domain.name,
+        semantic_cache_query: Optional[dict[str, Any]] = None
+        if self.config.semantic_cache_enabled:
+            semantic_cache_query = self.get_semantic_cache_query(
+                query=query,
+                domain_models=domain_models,
+                params=[
+                    retrieve_n_docs,
+                    doc_max_tokens,
+                    max_total_tokens,
+                    docs_max_count,
+                    self.config.context_packing_strategy,
+                    self.config.rerank_strategy,
+                    self.config.rerank_overfetch_multiplier,
+                    self.config.rerank_bm25_weight,
+                    self.config.duplicate_filter_enabled,
+                    self.config.near_duplicate_max_hamming_distance,
+                    self.config.mmr_enabled,
+                    self.config.mmr_lambda,
+                    self.config.neighbour_expansion_enabled,
+                    self.config.neighbour_expansion_window,
+                    doc_relevancy_check_enabled,
+                    doc_relevancy_check_llm_provider_name,
+                    doc_relevancy_check_llm_model_name,
+                    self.config.doc_relevancy_check_mode,
+                    self.config.doc_relevancy_prefilter_enabled,
+                    self.config.doc_relevancy_prefilter_accept_threshold,
+                    self.config.doc_relevancy_prefilter_reject_threshold,
+                    [doc_filter.model_dump() for doc_filter in filters or []],
+                ],
+            )
+            if semantic_cache_query is not None and (
+                cached_docs := SemanticRetrievalCache.get(
+                    similarity_threshold=self.config.semantic_cache_similarity_threshold,
+                    **semantic_cache_query,
                 )
+            ):
+                self.log.info("Returning documents from the semantic retrieval cache.")
+                return cached_docs
 
-                returned_documents_list.extend(returned_documents)
-            domain_doc_db_providers.clear()
+        rerank_enabled = self.config.rerank_strategy != "none"
+        returned_documents_list = self.query_doc_dbs(
+            query=query,
+            domain_models=domain_models,
+            retrieve_n_docs=(
+                retrieve_n_docs * max(1, self.config.rerank_overfetch_multiplier)
+                if rerank_enabled
+                else retrieve_n_docs
+            ),
+            filters=filters,
+        )
 
         preproc_docs = preprocess_retrieved_docs(
             retrieved_documents=returned_documents_list,
@@ -144,19 +219,57 @@ class DocRetrieval(ServiceBase):
             doc_max_tokens=doc_max_tokens,
         )
 
+        if rerank_enabled:
+            preproc_docs = rerank_retrieved_docs(
+                query=query,
+                retrieved_documents=preproc_docs,
+                top_n=retrieve_n_docs,
+                strategy=self.config.rerank_strategy,
+                bm25_weight=self.config.rerank_bm25_weight,
+                get_cosine_similarities=lambda docs: self.get_query_similarities(
+                    query=query, domain_models=domain_models, docs=docs
+                ),
+            )
+
+        if self.config.duplicate_filter_enabled:
+            preproc_docs = drop_duplicate_docs(
+                retrieved_documents=preproc_docs,
+                near_duplicate_max_distance=self.config.near_duplicate_max_hamming_distance,
+            )
+
+        if self.config.mmr_enabled:
+            preproc_docs = self.select_diverse_docs(
+                query=query, domain_models=domain_models, docs=preproc_docs
+            )
+
         if doc_relevancy_check_enabled:
             preproc_docs = self.doc_relevancy_check(
                 user_input=query,
                 preproc_docs=preproc_docs,
+                domain_models=domain_models,
                 llm_provider_name=doc_relevancy_check_llm_provider_name,
                 llm_model_name=doc_relevancy_check_llm_model_name,
                 consensus_after_n_tries=doc_relevancy_check_consensus_after_n_tries,
             )
 
+        if self.config.neighbour_expansion_enabled:
+            preproc_docs = expand_docs_with_neighbours(
+                retrieved_documents=preproc_docs,
+                neighbours=load_neighbour_chunks(
+                    self.doc_index.session,
+                    [doc.chunk_doc_db_id for doc in preproc_docs if doc.chunk_doc_db_id],
+                    window=self.config.neighbour_expansion_window,
+                ),
+                token_limit=min(doc_max_tokens, max_total_tokens),
+            )
+
         processed_docs_list = process_retrieved_docs(
             retrieved_documents=preproc_docs,
             max_total_tokens=max_total_tokens,
             docs_max_count=docs_max_count,
+            packing_strategy=self.config.context_packing_strategy,
+            # MMR order is kept since doc scores are still plain relevance
+            keep_order=self.config.mmr_enabled,
         )
 
         if processed_docs_list is None:
@@ -166,8 +279,149 @@ class DocRetrieval(ServiceBase):
             raise ValueError(
                 "No supporting documents found. Currently we don't support queries without supporting context."
             )
+        if semantic_cache_query is not None:
+            SemanticRetrievalCache.put(
+                documents=processed_docs_list,
+                ttl_seconds=self.config.semantic_cache_ttl_seconds,
+                max_entries=self.config.semantic_cache_max_entries,
+                **semantic_cache_query,
+            )
         return processed_docs_list
 
+    def get_semantic_cache_query(
+        self,
+        query: str,
+        domain_models: list[doc_index_models.DomainModel],
+        params: list[Any],
+    ) -> Optional[dict[str, Any]]:
+        """
+        Embeds the query with the first doc_db's embedder to key the semantic retrieval cache.
+        The query embedding cache makes the doc_db's own embedding of the query a hit.
+        """
+        if not (query_tasks := self.get_query_tasks(domain_models)):
+            return None
+        query_task = query_tasks[0]
+        embedding_service = DatabaseService.get_pooled(
+            doc_db_provider_name=query_task["doc_db_provider_name"],  # type: ignore
+            context_index_config=query_task["context_index_config"],
+            doc_db_embedding_provider_name=query_task["doc_db_embedding_provider_name"],
+            doc_db_embedding_provider_config=query_task["doc_db_embedding_provider_config"],
+        ).embedding_service
+        try:
+            query_embedding = embedding_service.get_embedding_of_text(query)
+        except Exception as error:
+            self.log.info(f"Skipping the semantic retrieval cache: {error}")
+            return None
+        return {
+            "domain_names": [domain.name for domain in domain_models],
+            "params_key": json.dumps(params, sort_keys=True, default=str),
+            "embedding_model_name": embedding_service.cache_model_name,
+            "query_embedding": query_embedding,
+        }
+
+    def get_query_tasks(
+        self, domain_models: list[doc_index_models.DomainModel]
+    ) -> list[dict[str, Any]]:
+        """One task per domain and doc_db pair, in a stable order."""
+        # ORM attributes are read here so the worker threads never touch the shared session
+        query_tasks: list[dict[str, Any]] = []
+        for domain in domain_models:
+            domain_doc_db_providers: dict[int, doc_index_models.DocDBModel] = {}
+            for source in domain.sources:
+                domain_doc_db_providers.setdefault(source.enabled_doc_db.id, source.enabled_doc_db)
+            for domain_doc_db_provider in domain_doc_db_providers.values():
+                query_tasks.append(
+                    {
+                        "domain_name": domain.name,
+                        "doc_db_provider_name": domain_doc_db_provider.name,
+                        "context_index_config": dict(domain_doc_db_provider.config),
+                        "doc_db_embedding_provider_name": domain_doc_db_provider.enabled_doc_embedder.name,
+                        "doc_db_embedding_provider_config": dict(
+                            domain_doc_db_provider.enabled_doc_embedder.config
+                        ),
+                    }
+                )
+        return query_tasks
+
+    def query_doc_dbs(
+        self,
+        query: str,
+        domain_models: list[doc_index_models.DomainModel],
+        retrieve_n_docs: int,
+        filters: Optional[list[MetadataFilter]] = None,
+    ) -> list[RetrievalDoc]:
+        """
+        Queries every domain and doc_db pair concurrently and returns the global top retrieve_n_docs.
+        Pairs that don't respond before doc_db_query_timeout_seconds are skipped.
+        """
+        query_tasks = self.get_query_tasks(domain_models)
+        if not query_tasks:
+            return []
+
+        executor = ThreadPoolExecutor(
+            max_workers=max(
+                1, min(self.config.doc_db_query_max_concurrent_requests, len(query_tasks))
+            )
+        )
+        futures = {
+            executor.submit(
+                self.query_doc_db,
+                query=query,
+                retrieve_n_docs=retrieve_n_docs,
+                filters=filters,
+                **query_task,
+            ): query_task
+            for query_task in query_tasks
+        }
+        done, not_done = wait(futures, timeout=self.config.doc_db_query_timeout_seconds)
+        # Don't block on stragglers past the deadline
+        executor.shutdown(wait=False, cancel_futures=True)
+        for future in not_done:
+            self.log.info(
+                f"Timed out querying {futures[future]['doc_db_provider_name']} for {futures[future]['domain_name']}."
+            )
+
+        returned_documents_list: list[RetrievalDoc] = []
+        for future in done:
+            try:
+                returned_documents_list.extend(future.result())
+            except Exception as error:
+                self.log.info(
+                    f"Failed querying {futures[future]['doc_db_provider_name']} for {futures[future]['domain_name']}: {error}"
+                )
+
+        return heapq.nlargest(retrieve_n_docs, returned_documents_list, key=lambda doc: doc.score)
+
+    def query_doc_db(
+        self,
+        query: str,
+        domain_name: str,
+        doc_db_provider_name: str,
+        context_index_config: dict[str, Any],
+        doc_db_embedding_provider_name: str,
+        doc_db_embedding_provider_config: dict[str, Any],
+        retrieve_n_docs: int,
+        filters: Optional[list[MetadataFilter]] = None,
+    ) -> list[RetrievalDoc]:
+        doc_db_service = DatabaseService.get_pooled(
+            doc_db_provider_name=doc_db_provider_name,  # type: ignore
+            context_index_config=context_index_config,
+            doc_db_embedding_provider_name=doc_db_embedding_provider_name,
+            doc_db_embedding_provider_config=doc_db_embedding_provider_config,
+        )
+        # SQLAlchemy sessions aren't thread safe so each query gets its own
+        session = IndexBase.indexbase_open_session()
+        try:
+            with DatabaseService.index_session(session):
+                return doc_db_service.query_by_terms(
+                    search_terms=query,
+                    retrieve_n_docs=retrieve_n_docs,
+                    domain_name=domain_name,
+                    filters=filters,
+                )
+        finally:
+            IndexBase.indexbase_close_session(session)
+
     def doc_relevancy_check(
         self,
         user_input: str,
@@ -177,6 +431,7 @@ class DocRetrieval(ServiceBase):
         llm_model_name: Optional[str] = None,
         prompt_string: Optional[str] = None,
         prompt_template_path: Optional[str] = None,
+        domain_models: Optional[list[doc_index_models.DomainModel]] = None,
     ) -> list[RetrievalDoc]:
         if consensus_after_n_tries is None:
             consensus_after_n_tries = self.config.doc_relevancy_check_consensus_after_n_tries
@@ -187,22 +442,184 @@ class DocRetrieval(ServiceBase):
         if prompt_string is None and prompt_template_path is None:
             prompt_template_path = self.DOC_RELEVANCY_CHECK_PROMPTY_TEMPLATE_PATH
 
+        if not preproc_docs:
+            return []
+        mode = self.config.doc_relevancy_check_mode
+        if mode not in ["sequential", "concurrent", "batched"]:
+            raise ValueError(f"doc_relevancy_check_mode {mode} not supported.")
+
+        relevant_doc_ids: set[int] = set()
+        if self.config.doc_relevancy_prefilter_enabled and domain_models:
+            similarities = self.get_query_similarities(
+                query=user_input, domain_models=domain_models, docs=preproc_docs
+            )
+            ambiguous_docs: list[RetrievalDoc] = []
+            for doc, similarity in zip(preproc_docs, similarities):
+                if similarity is None or (
+                    self.config.doc_relevancy_prefilter_reject_threshold
+                    < similarity
+                    < self.config.doc_relevancy_prefilter_accept_threshold
+                ):
+                    ambiguous_docs.append(doc)
+                elif similarity >= self.config.doc_relevancy_prefilter_accept_threshold:
+                    relevant_doc_ids.add(id(doc))
+            self.log.info(
+                f"Relevancy prefilter accepted {len(relevant_doc_ids)} and rejected {len(preproc_docs) - len(relevant_doc_ids) - len(ambiguous_docs)} docs. {len(ambiguous_docs)} go to the LLM."
+            )
+        else:
+            ambiguous_docs = preproc_docs
+        if not ambiguous_docs:
+            return [doc for doc in preproc_docs if id(doc) in relevant_doc_ids]
+
         action_agent = ActionAgent(
             llm_provider_name=llm_provider_name,  # type: ignore
             llm_model_name=llm_model_name,
         )
 
-        relevant_docs: list[RetrievalDoc] = []
-        for doc in preproc_docs:
-            if action_agent.boolean_classifier(
-                feature=doc.context_chunk,
-                user_input=user_input,
-                prompt_string=prompt_string,
-                prompt_template_path=prompt_template_path,
-                consensus_after_n_tries=consensus_after_n_tries,
+        if mode == "batched":
+            batch_size = max(1, self.config.doc_relevancy_check_batch_size)
+            batches = [
+                ambiguous_docs[start : start + batch_size]
+                for start in range(0, len(ambiguous_docs), batch_size)
+            ]
+
+            def classify_batch(docs: list[RetrievalDoc]) -> list[bool]:
+                return action_agent.multi_boolean_classifier(
+                    features=[doc.context_chunk for doc in docs],
+                    user_input=user_input,
+                    prompt_string=prompt_string,
+                    prompt_template_path=prompt_template_path,
+                    consensus_after_n_tries=consensus_after_n_tries,
+                )
+
+            tasks, classify = batches, classify_batch
+        else:
+
+            def classify_doc(doc: RetrievalDoc) -> list[bool]:
+                return [
+                    action_agent.boolean_classifier(
+                        feature=doc.context_chunk,
+                        user_input=user_input,
+                        prompt_string=prompt_string,
+                        prompt_template_path=prompt_template_path,
+                        consensus_after_n_tries=consensus_after_n_tries,
+                    )
+                ]
+
+            tasks, classify = ambiguous_docs, classify_doc
+
+        max_workers = (
+            1 if mode == "sequential" else self.config.doc_relevancy_check_max_concurrent_requests
+        )
+        if max_workers <= 1 or len(tasks) == 1:
+            task_answers = [classify(task) for task in tasks]
+        else:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(tasks))) as executor:
+                # map keeps the answers in document order
+                task_answers = list(executor.map(classify, tasks))
+
+        answers = [answer for answers in task_answers for answer in answers]
+        relevant_doc_ids.update(
+            id(doc) for doc, is_relevant in zip(ambiguous_docs, answers) if is_relevant
+        )
+        return [doc for doc in preproc_docs if id(doc) in relevant_doc_ids]
+
+    def get_normalized_embeddings(
+        self,
+        query: str,
+        domain_models: list[doc_index_models.DomainModel],
+        docs: list[RetrievalDoc],
+    ) -> list[Optional[tuple[np.ndarray, np.ndarray]]]:
+        """
+        Unit length (query, chunk) embedding pairs per doc, from the chunk embeddings stored at ingest.
+        The query is embedded with each doc_db's own embedder, and the query embedding cache makes
+        that a hit. None for docs without a stored embedding.
+        """
+        query_embeddings: dict[str, np.ndarray] = {}
+        try:
+            for query_task in self.get_query_tasks(domain_models):
+                if query_task["doc_db_provider_name"] in query_embeddings:
+                    continue
+                embedding_service = DatabaseService.get_pooled(
+                    doc_db_provider_name=query_task["doc_db_provider_name"],  # type: ignore
+                    context_index_config=query_task["context_index_config"],
+                    doc_db_embedding_provider_name=query_task["doc_db_embedding_provider_name"],
+                    doc_db_embedding_provider_config=query_task["doc_db_embedding_provider_config"],
+                ).embedding_service
+                query_embeddings[query_task["doc_db_provider_name"]] = np.asarray(
+                    embedding_service.get_embedding_of_text(query), dtype=np.float32
+                )
+        except Exception as error:
+            self.log.info(f"Failed embedding the query: {error}")
+            return [None] * len(docs)
+
+        chunk_embeddings = load_chunk_embeddings_by_ids(
+            self.doc_index.session, [doc.chunk_doc_db_id for doc in docs if doc.chunk_doc_db_id]
+        )
+        embeddings: list[Optional[tuple[np.ndarray, np.ndarray]]] = []
+        for doc in docs:
+            chunk_doc_db_name, chunk_embedding = chunk_embeddings.get(
+                doc.chunk_doc_db_id or "", (None, None)
+            )
+            query_embedding = query_embeddings.get(chunk_doc_db_name or "")
+            if (
+                chunk_embedding is None
+                or query_embedding is None
+                or len(chunk_embedding) != len(query_embedding)
             ):
-                relevant_docs.append(doc)
-        return relevant_docs
+                embeddings.append(None)
+                continue
+            query_norm = np.linalg.norm(query_embedding)
+            chunk_norm = np.linalg.norm(chunk_embedding)
+            if not query_norm or not chunk_norm:
+                embeddings.append(None)
+                continue
+            embeddings.append(
+                (query_embedding / query_norm, chunk_embedding.astype(np.float32) / chunk_norm)
+            )
+        return embeddings
+
+    def select_diverse_docs(
+        self,
+        query: str,
+        domain_models: list[doc_index_models.DomainModel],
+        docs: list[RetrievalDoc],
+    ) -> list[RetrievalDoc]:
+        """
+        Orders docs by MMR so overlapping neighbour chunks are demoted.
+        Relevance is the current doc score and redundancy is cosine between stored chunk embeddings.
+        """
+        if len(docs) < 2:
+            return docs
+        embeddings = self.get_normalized_embeddings(query, domain_models, docs)
+        # Chunks from doc_dbs with a different embedding dimension are never penalized
+        dimension = next((len(pair[1]) for pair in embeddings if pair is not None), 0)
+        doc_embeddings = np.zeros((len(docs), dimension), dtype=np.float32)
+        for i, pair in enumerate(embeddings):
+            if pair is not None and len(pair[1]) == dimension:
+                doc_embeddings[i] = pair[1]
+        return select_docs_mmr(
+            retrieved_documents=docs,
+            relevances=min_max_normalize(np.array([doc.score for doc in docs], dtype=np.float32)),
+            doc_embeddings=doc_embeddings,
+            mmr_lambda=self.config.mmr_lambda,
+        )
+
+    def get_query_similarities(
+        self,
+        query: str,
+        domain_models: list[doc_index_models.DomainModel],
+        docs: list[RetrievalDoc],
+    ) -> list[Optional[float]]:
+        """Cosine similarity of each doc to the query, None when it can't be computed locally."""
+        similarities: list[Optional[float]] = []
+        for embeddings in self.get_normalized_embeddings(query, domain_models, docs):
+            if embeddings is None:
+                similarities.append(None)
+                continue
+            query_embedding, chunk_embedding = embeddings
+            similarities.append(float(query_embedding @ chunk_embedding))
+        return similarities
 
     def create_settings_ui(self):
         components = {}
@@ -226,6 +643,11 @@ class DocRetrieval(ServiceBase):
                 value=self.config.doc_relevancy_check_consensus_after_n_tries,
                 label="Generate a consensus for each document's relevancy with N Tries",
             )
+            components["doc_relevancy_check_mode"] = gr.Dropdown(
+                value=self.config.doc_relevancy_check_mode,
+                choices=["sequential", "concurrent", "batched"],
+                label="Doc Relevancy Check Mode",
+            )
         with gr.Row():
             components["doc_max_tokens"] = gr.Number(
                 value=self.config.doc_max_tokens,
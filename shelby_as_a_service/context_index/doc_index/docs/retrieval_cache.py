@@ -0,0 +1,104 @@
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+from context_index.doc_index.docs.context_docs import RetrievalDoc
+from pydantic import BaseModel
+
+
+class RetrievalCacheEntry(BaseModel):
+    domain_names: frozenset[str]
+    params_key: str
+    embedding_model_name: str
+    query_embedding: np.ndarray
+    documents: list[RetrievalDoc]
+    expires_at: float
+
+    class Config:
+        arbitrary_types_allowed = True
+
+
+class SemanticRetrievalCache:
+    """
+    Process wide cache of final retrieval results keyed by query embedding similarity.
+    A query hits when its embedding is within the cosine threshold of a cached query for the same
+    domains, retrieval params and embedding model. DocIngest invalidates a domain's entries when
+    it writes to that domain.
+    """
+
+    _entries: list[RetrievalCacheEntry] = []
+    _lock = threading.Lock()
+
+    @staticmethod
+    def normalize(query_embedding: list[float]) -> np.ndarray:
+        vector = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    @classmethod
+    def get(
+        cls,
+        domain_names: list[str],
+        params_key: str,
+        embedding_model_name: str,
+        query_embedding: list[float],
+        similarity_threshold: float,
+    ) -> Optional[list[RetrievalDoc]]:
+        query_vector = cls.normalize(query_embedding)
+        domain_key = frozenset(domain_names)
+        now = time.monotonic()
+        with cls._lock:
+            cls._entries = [entry for entry in cls._entries if entry.expires_at > now]
+            candidates = [
+                entry
+                for entry in cls._entries
+                if entry.domain_names == domain_key
+                and entry.params_key == params_key
+                and entry.embedding_model_name == embedding_model_name
+                and len(entry.query_embedding) == len(query_vector)
+            ]
+            if not candidates:
+                return None
+            similarities = np.stack([entry.query_embedding for entry in candidates]) @ query_vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < similarity_threshold:
+                return None
+            return [doc.model_copy() for doc in candidates[best].documents]
+
+    @classmethod
+    def put(
+        cls,
+        domain_names: list[str],
+        params_key: str,
+        embedding_model_name: str,
+        query_embedding: list[float],
+        documents: list[RetrievalDoc],
+        ttl_seconds: float,
+        max_entries: int,
+    ):
+        entry = RetrievalCacheEntry(
+            domain_names=frozenset(domain_names),
+            params_key=params_key,
+            embedding_model_name=embedding_model_name,
+            query_embedding=cls.normalize(query_embedding),
+            documents=[doc.model_copy() for doc in documents],
+            expires_at=time.monotonic() + ttl_seconds,
+        )
+        with cls._lock:
+            cls._entries.append(entry)
+            # Oldest entries are dropped first
+            if len(cls._entries) > max_entries:
+                cls._entries = cls._entries[-max_entries:]
+
+    @classmethod
+    def invalidate(cls):
+        with cls._lock:
+            cls._entries = []
+
+    @classmethod
+    def invalidate_domains(cls, domain_names: list[str]):
+        with cls._lock:
+            cls._entries = [
+                entry for entry in cls._entries if entry.domain_names.isdisjoint(domain_names)
+            ]
@@ -0,0 +1,82 @@
+import pickle
+import struct
+from typing import Any, Optional
+
+import numpy as np
+from sqlalchemy import LargeBinary
+from sqlalchemy.types import TypeDecorator
+
+# magic, dtype code, dimension
+EMBEDDING_HEADER = struct.Struct("<4sBI")
+EMBEDDING_MAGIC = b"EMB1"
+EMBEDDING_DTYPES: dict[int, np.dtype] = {
+    0: np.dtype("<f4"),
+    1: np.dtype("<f2"),
+}
+EMBEDDING_DTYPE_CODES: dict[str, int] = {"float32": 0, "float16": 1}
+
+
+def is_embedding_blob(blob: bytes) -> bool:
+    return blob[: len(EMBEDDING_MAGIC)] == EMBEDDING_MAGIC
+
+
+def encode_embedding(embedding: Any, dtype: str = "float32") -> bytes:
+    if dtype not in EMBEDDING_DTYPE_CODES:
+        raise ValueError(f"Unsupported embedding dtype {dtype}")
+    dtype_code = EMBEDDING_DTYPE_CODES[dtype]
+    values = np.asarray(embedding, dtype=EMBEDDING_DTYPES[dtype_code]).ravel()
+    return EMBEDDING_HEADER.pack(EMBEDDING_MAGIC, dtype_code, values.size) + values.tobytes()
+
+
+def decode_embedding(blob: bytes) -> np.ndarray:
+    if not is_embedding_blob(blob):
+        # Rows written before embeddings were stored as blobs
+        return np.asarray(pickle.loads(blob), dtype=np.float32)
+    _, dtype_code, dimension = EMBEDDING_HEADER.unpack_from(blob)
+    return np.frombuffer(
+        blob, dtype=EMBEDDING_DTYPES[dtype_code], count=dimension, offset=EMBEDDING_HEADER.size
+    )
+
+
+def decode_embedding_matrix(blobs: list[bytes]) -> np.ndarray:
+    """Decodes blobs into one contiguous float32 matrix with a row per blob."""
+    if not blobs:
+        return np.zeros((0, 0), dtype=np.float32)
+    if not all(is_embedding_blob(blob) for blob in blobs):
+        return np.vstack([decode_embedding(blob) for blob in blobs]).astype(np.float32)
+    _, dtype_code, dimension = EMBEDDING_HEADER.unpack_from(blobs[0])
+    expected_size = EMBEDDING_HEADER.size + dimension * EMBEDDING_DTYPES[dtype_code].itemsize
+    if any(len(blob) != expected_size or blob[4] != dtype_code for blob in blobs):
+        return np.vstack([decode_embedding(blob) for blob in blobs]).astype(np.float32)
+    # Same dtype and dimension throughout so the payloads can be read as one buffer
+    payloads = b"".join(memoryview(blob)[EMBEDDING_HEADER.size :] for blob in blobs)
+    matrix = np.frombuffer(payloads, dtype=EMBEDDING_DTYPES[dtype_code]).reshape(
+        len(blobs), dimension
+    )
+    return matrix.astype(np.float32, copy=False)
+
+
+class EmbeddingBlob(TypeDecorator):
+    """
+    Stores an embedding as a raw float32 or float16 blob with a dtype and dimension header.
+    Values are returned as list[float]. Legacy pickled rows are still readable.
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def __init__(self, dtype: str = "float32", *args, **kwargs):
+        if dtype not in EMBEDDING_DTYPE_CODES:
+            raise ValueError(f"Unsupported embedding dtype {dtype}")
+        self.dtype = dtype
+        super().__init__(*args, **kwargs)
+
+    def process_bind_param(self, value: Any, dialect) -> Optional[bytes]:
+        if value is None:
+            return None
+        return encode_embedding(value, self.dtype)
+
+    def process_result_value(self, value: Optional[bytes], dialect) -> Optional[list[float]]:
+        if value is None:
+            return None
+        return decode_embedding(value).astype(np.float32).tolist()
@@ -3,7 +3,7 @@ import typing
 from typing import Any, Literal, Optional, Type, get_args
 
 from app.app_base import AppBase, LoggerWrapper
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
 
 
@@ -27,9 +27,33 @@ class IndexBase(AppBase):
         os.makedirs(cls.local_index_dir, exist_ok=True)
         IndexBase.engine = create_engine(f"sqlite:///{db_path}")
         Base.metadata.create_all(cls.engine)
+        cls.add_missing_columns()
         IndexBase._session_factory = sessionmaker(bind=cls.engine, expire_on_commit=False)
         IndexBase._write_session_factory = sessionmaker(bind=cls.engine)
 
+    @classmethod
+    def add_missing_columns(cls):
+        """
+        create_all skips existing tables, so nullable columns and indexes added to a model are
+        added here.
+        """
+        inspector = inspect(cls.engine)
+        with cls.engine.begin() as connection:
+            for table in Base.metadata.sorted_tables:
+                if not inspector.has_table(table.name):
+                    continue
+                existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name in existing_columns or not column.nullable:
+                        continue
+                    column_type = column.type.compile(dialect=cls.engine.dialect)
+                    connection.execute(
+                        text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}')
+                    )
+                    cls.log.info(f"Added column {column.name} to {table.name}")
+                for index in table.indexes:
+                    index.create(connection, checkfirst=True)
+
     @classmethod
     def indexbase_open_session(cls, obj: Optional[Any] = None) -> Session:
         if IndexBase._session_factory is None:
@@ -1,8 +1,13 @@
+import threading
 from abc import ABC, abstractmethod
-from typing import Any, Optional
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
 
+from context_index.doc_index.docs.context_docs import RetrievalDoc, hydrate_retrieval_docs
 from pydantic import BaseModel
+from services.database.metadata_filter import MetadataFilter
 from services.service_base import ServiceBase
+from sqlalchemy.orm import Session
 
 
 class ClassConfigModel(BaseModel):
@@ -20,10 +25,45 @@ class ClassConfigModel(BaseModel):
 
 class DatabaseBase(ABC, ServiceBase):
     DOC_DB_REQUIRES_EMBEDDINGS: bool
+    # Whether the provider can store and query sparse vectors natively for hybrid search
+    SUPPORTS_SPARSE_VALUES: bool = False
     domain_name: str
     DOC_INDEX_KEY: str = "enabled_doc_db"
 
     config: ClassConfigModel
+    # Pooled instances are shared across threads, so per call sessions are scoped to the thread
+    _thread_sessions = threading.local()
+
+    @staticmethod
+    @contextmanager
+    def index_session(session: Optional[Session]) -> Iterator[None]:
+        previous_session = getattr(DatabaseBase._thread_sessions, "session", None)
+        DatabaseBase._thread_sessions.session = session
+        try:
+            yield
+        finally:
+            DatabaseBase._thread_sessions.session = previous_session
+
+    def get_index_session(self) -> Session:
+        # Ingest passes its write session through, otherwise use the doc index's read session
+        if session := getattr(DatabaseBase._thread_sessions, "session", None):
+            return session
+        if session := getattr(self, "session", None):
+            return session
+        return self.doc_index.session
+
+    def hydrate_matches(
+        self, matches_per_term: list[list[tuple[str, float]]]
+    ) -> list[list[RetrievalDoc]]:
+        returned_documents_per_term = hydrate_retrieval_docs(
+            session=self.get_index_session(), matches_per_term=matches_per_term
+        )
+        for matches, returned_documents in zip(matches_per_term, returned_documents_per_term):
+            if len(returned_documents) < len(matches):
+                found_ids = {doc.chunk_doc_db_id for doc in returned_documents}
+                missing_ids = [doc_db_id for doc_db_id, _ in matches if doc_db_id not in found_ids]
+                self.log.info(f"Chunks {missing_ids} not found in index. Skipping.")
+        return returned_documents_per_term
 
     def get_index_domain_or_source_entry_count_with_provider(
         self, source_name: Optional[str] = None, domain_name: Optional[str] = None
@@ -35,9 +75,21 @@ class DatabaseBase(ABC, ServiceBase):
         search_terms: list[float] | str,
         domain_name: str,
         retrieve_n_docs: Optional[int] = None,
+        filters: Optional[list[MetadataFilter]] = None,
     ) -> list[dict]:
         raise NotImplementedError
 
+    def query_many_with_provider(
+        self,
+        search_terms: list[list[float]] | list[str],
+        domain_name: str,
+        retrieve_n_docs: Optional[int] = None,
+        filters: Optional[list[MetadataFilter]] = None,
+        sparse_search_terms: Optional[list[Optional[dict[str, Any]]]] = None,
+    ) -> list[list[Any]]:
+        """Runs N queries and returns N result lists in the same order as search_terms."""
+        raise NotImplementedError
+
     def fetch_by_ids_with_provider(
         self,
         ids: list[str],
@@ -50,6 +102,7 @@ class DatabaseBase(ABC, ServiceBase):
         id: str,
         values: Optional[list[float]],
         metadata: dict[str, Any],
+        sparse_values: Optional[dict[str, Any]] = None,
     ) -> dict[str, Any]:
         raise NotImplementedError
 
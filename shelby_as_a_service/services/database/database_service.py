@@ -1,11 +1,22 @@
+import threading
 from typing import Any, Optional, Type
 
 import context_index.doc_index as doc_index_models
+import numpy as np
 import services.database as database
 from context_index.doc_index.docs.context_docs import IngestDoc, RetrievalDoc
+from context_index.index_base import IndexBase
 from services.database.database_base import DatabaseBase
+from services.database.domain_bm25 import DomainBM25, sparse_dot
+from services.database.metadata_filter import MetadataFilter
 from services.embedding.embedding_service import EmbeddingService
 from services.gradio_interface.gradio_base import GradioBase
+from services.service_pool import ServicePool
+from services.text_processing.pinecone_io_pinecone_text.hybrid import hybrid_convex_scale
+from services.text_processing.pinecone_io_pinecone_text.sparse import SparseVector
+from services.text_processing.pinecone_io_pinecone_text.sparse.bm25_encoder import BM25Encoder
+from services.text_processing.rerank_retrieval import min_max_normalize
+from sqlalchemy.orm import Session
 
 
 class DatabaseService(DatabaseBase):
@@ -15,6 +26,9 @@ class DatabaseService(DatabaseBase):
     REQUIRED_CLASSES: list[Type] = database.AVAILABLE_PROVIDERS
     AVAILABLE_PROVIDERS_UI_NAMES: list[str] = database.AVAILABLE_PROVIDERS_UI_NAMES
     AVAILABLE_PROVIDERS_TYPINGS = database.AVAILABLE_PROVIDERS_TYPINGS
+    RECONCILE_FETCH_BATCH_SIZE: int = 100
+    SPARSE_REUPSERT_BATCH_SIZE: int = 100
+    HYBRID_CANDIDATE_MULTIPLIER: int = 4
 
     def __init__(
         self,
@@ -34,18 +48,53 @@ class DatabaseService(DatabaseBase):
             raise ValueError("current_provider_instance not properly set!")
 
         self.doc_db_provider: DatabaseBase = self.current_provider_instance
+        # Failed writes waiting for the caller's transaction to end, see persist_failed_ledger_entries
+        self.failed_ledger_entries: list[dict[str, Any]] = []
+        self.failed_ledger_entries_lock = threading.Lock()
 
         if self.doc_db_provider.DOC_DB_REQUIRES_EMBEDDINGS:
-            self.embedding_service = EmbeddingService(
-                embedding_provider_name=doc_db_embedding_provider_name,  # type: ignore
-                context_index_config=doc_db_embedding_provider_config,
+            self.embedding_service = ServicePool.get_or_create(
+                EmbeddingService,
+                lambda: EmbeddingService(
+                    embedding_provider_name=doc_db_embedding_provider_name,  # type: ignore
+                    context_index_config=doc_db_embedding_provider_config,
+                ),
+                doc_db_embedding_provider_name,
+                doc_db_embedding_provider_config,
             )
 
+    @classmethod
+    def get_pooled(
+        cls,
+        doc_db_provider_name: database.AVAILABLE_PROVIDERS_TYPINGS,
+        doc_db_embedding_provider_name: Optional[str] = None,
+        doc_db_embedding_provider_config: dict[str, Any] = {},
+        context_index_config: dict[str, Any] = {},
+    ) -> "DatabaseService":
+        """
+        Returns a shared instance for the provider and configs.
+        Wrap calls that need a specific session in DatabaseBase.index_session.
+        """
+        return ServicePool.get_or_create(
+            cls,
+            lambda: cls(
+                doc_db_provider_name=doc_db_provider_name,
+                doc_db_embedding_provider_name=doc_db_embedding_provider_name,
+                doc_db_embedding_provider_config=doc_db_embedding_provider_config,
+                context_index_config=context_index_config,
+            ),
+            doc_db_provider_name,
+            context_index_config,
+            doc_db_embedding_provider_name,
+            doc_db_embedding_provider_config,
+        )
+
     def query_by_terms(
         self,
         domain_name: str,
         search_terms: list[str] | str,
         retrieve_n_docs: Optional[int] = None,
+        filters: Optional[list[MetadataFilter]] = None,
     ) -> list[RetrievalDoc]:
         if isinstance(search_terms, str):
             search_terms = [search_terms]
@@ -57,17 +106,180 @@ class DatabaseService(DatabaseBase):
         else:
             terms = search_terms
 
-        retrieved_docs = []
-        for term in terms:
-            docs = self.doc_db_provider.query_by_terms_with_provider(
-                search_terms=term, retrieve_n_docs=retrieve_n_docs, domain_name=domain_name
+        if self.hybrid_search_enabled and (bm25 := self.domain_bm25.load(domain_name)):
+            docs_per_term = self.query_hybrid(
+                search_terms=search_terms,
+                terms=terms,
+                bm25=bm25,
+                domain_name=domain_name,
+                retrieve_n_docs=retrieve_n_docs,
+                filters=filters,
             )
+        else:
+            docs_per_term = self.doc_db_provider.query_many_with_provider(
+                search_terms=terms,
+                retrieve_n_docs=retrieve_n_docs,
+                domain_name=domain_name,
+                filters=filters,
+            )
+
+        retrieved_docs = []
+        for search_term, docs in zip(search_terms, docs_per_term):
             if docs:
                 retrieved_docs.extend(docs)
             else:
-                self.log.info(f"No documents found for {term}")
+                self.log.info(f"No documents found for {search_term}")
         return retrieved_docs
 
+    @property
+    def hybrid_search_enabled(self) -> bool:
+        return getattr(self.doc_db_provider.config, "hybrid_search_enabled", False)
+
+    @property
+    def domain_bm25(self) -> DomainBM25:
+        return DomainBM25(local_index_dir=self.local_index_dir)
+
+    def query_hybrid(
+        self,
+        search_terms: list[str],
+        terms: list[Any],
+        bm25: BM25Encoder,
+        domain_name: str,
+        retrieve_n_docs: Optional[int] = None,
+        filters: Optional[list[MetadataFilter]] = None,
+    ) -> list[list[RetrievalDoc]]:
+        alpha = self.doc_db_provider.config.hybrid_alpha
+        # A query of only stopwords has no sparse terms so it's searched dense only
+        sparse_terms: list[Optional[SparseVector]] = [
+            sparse_term if sparse_term["indices"] else None
+            for sparse_term in bm25.encode_queries(search_terms)
+        ]
+
+        if self.doc_db_provider.SUPPORTS_SPARSE_VALUES:
+            scaled_terms = [
+                hybrid_convex_scale(term, sparse_term, alpha) if sparse_term else (term, None)
+                for term, sparse_term in zip(terms, sparse_terms)
+            ]
+            return self.doc_db_provider.query_many_with_provider(
+                search_terms=[dense for dense, _ in scaled_terms],
+                sparse_search_terms=[sparse for _, sparse in scaled_terms],
+                retrieve_n_docs=retrieve_n_docs,
+                domain_name=domain_name,
+                filters=filters,
+            )
+
+        # Otherwise over-fetch dense candidates and blend in their BM25 scores.
+        # Both are min-max normalized over the candidates since BM25 is unbounded.
+        if retrieve_n_docs is None:
+            retrieve_n_docs = self.doc_db_provider.config.retrieve_n_docs
+        docs_per_term = self.doc_db_provider.query_many_with_provider(
+            search_terms=terms,
+            retrieve_n_docs=retrieve_n_docs * self.HYBRID_CANDIDATE_MULTIPLIER,
+            domain_name=domain_name,
+            filters=filters,
+        )
+        for docs, sparse_term in zip(docs_per_term, sparse_terms):
+            if not sparse_term or not docs:
+                continue
+            dense_scores = np.array([doc.score for doc in docs], dtype=np.float32)
+            sparse_scores = np.array(
+                [
+                    sparse_dot(
+                        sparse_term,
+                        DomainBM25.encode_document(bm25, doc.chunk_doc_db_id, doc.context_chunk),
+                    )
+                    for doc in docs
+                ],
+                dtype=np.float32,
+            )
+            scores = alpha * min_max_normalize(dense_scores) + (1 - alpha) * min_max_normalize(
+                sparse_scores
+            )
+            for doc, score in zip(docs, scores):
+                doc.score = float(score)
+            docs.sort(key=lambda doc: doc.score, reverse=True)
+        return [docs[:retrieve_n_docs] for docs in docs_per_term]
+
+    def get_domain_chunks_query(self, domain: doc_index_models.DomainModel):
+        return (
+            self.get_index_session()
+            .query(doc_index_models.ChunkModel)
+            .join(doc_index_models.DocumentModel)
+            .join(doc_index_models.SourceModel)
+            .filter(doc_index_models.SourceModel.domain_id == domain.id)
+        )
+
+    def get_domain_bm25_for_upsert(
+        self, domain: doc_index_models.DomainModel
+    ) -> Optional[BM25Encoder]:
+        """
+        Returns the domain's BM25 params, fitting them if the domain has none.
+        Refitting reads every chunk of the domain, so ingest only refits once the chunk count has
+        moved by bm25_refit_change_threshold since the last fit. Until then new chunks are encoded
+        with the stored IDF, the same IDF queries use.
+        """
+        if (bm25 := self.domain_bm25.load(domain.name)) is None or not bm25.n_docs:
+            return self.refit_domain_bm25(domain)
+        chunk_count = self.get_domain_chunks_query(domain).count()
+        threshold = getattr(self.doc_db_provider.config, "bm25_refit_change_threshold", 0.2)
+        if abs(chunk_count - bm25.n_docs) / bm25.n_docs < threshold:
+            return bm25
+        return self.refit_domain_bm25(domain)
+
+    def refit_domain_bm25(self, domain: doc_index_models.DomainModel) -> Optional[BM25Encoder]:
+        """
+        Refits the domain's BM25 params and re-upserts the sparse vectors already in the doc db,
+        so stored vectors and queries share one IDF. Costs a pass over the domain's chunks.
+        """
+        bm25 = self.fit_domain_bm25(domain)
+        if bm25 and self.doc_db_provider.SUPPORTS_SPARSE_VALUES:
+            self.reupsert_domain_sparse_values(domain=domain, bm25=bm25)
+        return bm25
+
+    def reupsert_domain_sparse_values(
+        self, domain: doc_index_models.DomainModel, bm25: BM25Encoder
+    ):
+        """Chunks without an embedding haven't been upserted yet and are skipped."""
+        chunks_query = (
+            self.get_domain_chunks_query(domain)
+            .filter(doc_index_models.ChunkModel.chunk_doc_db_id.is_not(None))
+            .filter(doc_index_models.ChunkModel.chunk_embedding.is_not(None))
+            .order_by(doc_index_models.ChunkModel.id)
+        )
+        reupserted_count = 0
+        entries_to_upsert = []
+        for chunk in chunks_query.yield_per(self.SPARSE_REUPSERT_BATCH_SIZE):
+            entries_to_upsert.append(
+                self.doc_db_provider.prepare_upsert_for_vectorstore_with_provider(
+                    id=chunk.chunk_doc_db_id,
+                    values=chunk.chunk_embedding,
+                    metadata=chunk.prepare_upsert_metadata(),
+                    sparse_values=bm25.encode_documents(chunk.context_chunk),  # type: ignore
+                )
+            )
+            if len(entries_to_upsert) >= self.SPARSE_REUPSERT_BATCH_SIZE:
+                self.upsert(entries_to_upsert=entries_to_upsert, domain_name=domain.name)
+                reupserted_count += len(entries_to_upsert)
+                entries_to_upsert = []
+        if entries_to_upsert:
+            self.upsert(entries_to_upsert=entries_to_upsert, domain_name=domain.name)
+            reupserted_count += len(entries_to_upsert)
+        self.log.info(f"Re-upserted {reupserted_count} sparse vectors for {domain.name}.")
+
+    def fit_domain_bm25(self, domain: doc_index_models.DomainModel) -> Optional[BM25Encoder]:
+        """Fits the domain's BM25 params from all of its chunks in the index."""
+        corpus = [
+            row[0]
+            for row in self.get_index_session()
+            .query(doc_index_models.ChunkModel.context_chunk)
+            .join(doc_index_models.DocumentModel)
+            .join(doc_index_models.SourceModel)
+            .filter(doc_index_models.SourceModel.domain_id == domain.id)
+            .all()
+        ]
+        self.log.info(f"Fitting BM25 for {domain.name} on {len(corpus)} chunks.")
+        return self.domain_bm25.fit(domain_name=domain.name, corpus=corpus)
+
     def fetch_by_ids(
         self,
         domain_name: str,
@@ -85,12 +297,7 @@ class DatabaseService(DatabaseBase):
         self,
         entries_to_upsert: list[dict[str, Any]],
         domain_name: str,
-    ):
-        current_entry_count = (
-            self.doc_db_provider.get_index_domain_or_source_entry_count_with_provider(
-                domain_name=domain_name
-            )
-        )
+    ) -> Any:
         self.log.info(
             f"Upserting {len(entries_to_upsert)} entries to {self.doc_db_provider.CLASS_NAME}"
         )
@@ -99,49 +306,47 @@ class DatabaseService(DatabaseBase):
             entries_to_upsert=entries_to_upsert, domain_name=domain_name
         )
 
-        post_upsert_entry_count = (
-            self.doc_db_provider.get_index_domain_or_source_entry_count_with_provider(
-                domain_name=domain_name
-            )
-        )
-        if post_upsert_entry_count - current_entry_count != len(entries_to_upsert):
+        upserted_count = self.get_upserted_count(response)
+        if upserted_count is not None and upserted_count != len(entries_to_upsert):
             raise ValueError(
-                f"Upserted {len(entries_to_upsert)} entries but expected to upsert {post_upsert_entry_count - current_entry_count}.\n Response: {response}"
+                f"Expected to upsert {len(entries_to_upsert)} entries but upserted {upserted_count}.\n Response: {response}"
             )
         self.log.info(
             f"Successfully upserted {len(entries_to_upsert)} entries to {self.CLASS_NAME}.\n Response: {response}"
         )
+        return response
 
     def clear_existing_entries_by_id(
         self,
         domain_name: str,
         doc_db_ids_requiring_deletion: list[str] | str,
+        source_name: Optional[str] = None,
     ) -> bool:
-        existing_entry_count = (
-            self.doc_db_provider.get_index_domain_or_source_entry_count_with_provider(
-                domain_name=domain_name
-            )
-        )
         if not isinstance(doc_db_ids_requiring_deletion, list):
             doc_db_ids_requiring_deletion = [doc_db_ids_requiring_deletion]
 
-        response = self.doc_db_provider.clear_existing_entries_by_id_with_provider(
-            doc_db_ids_requiring_deletion=doc_db_ids_requiring_deletion,
+        ledger_entries = self.record_ledger_entries(
+            operation=doc_index_models.DocDBWriteLedgerModel.OPERATION_DELETE,
             domain_name=domain_name,
+            source_name=source_name,
+            doc_db_ids=doc_db_ids_requiring_deletion,
         )
-        post_delete_entry_count = (
-            self.doc_db_provider.get_index_domain_or_source_entry_count_with_provider(
-                domain_name=domain_name
-            )
-        )
-        if existing_entry_count - post_delete_entry_count != len(doc_db_ids_requiring_deletion):
-            raise ValueError(
-                f"Deleted {len(doc_db_ids_requiring_deletion)} entries but expected to delete {existing_entry_count - post_delete_entry_count}.\n Response: {response}"
+        try:
+            response = self.doc_db_provider.clear_existing_entries_by_id_with_provider(
+                doc_db_ids_requiring_deletion=doc_db_ids_requiring_deletion,
+                domain_name=domain_name,
             )
-        else:
-            self.log.info(
-                f"Deleted {len(doc_db_ids_requiring_deletion)} entries from {self.CLASS_NAME}."
+        except Exception:
+            self.set_ledger_entries_status(
+                ledger_entries, doc_index_models.DocDBWriteLedgerModel.STATUS_FAILED
             )
+            raise
+        self.set_ledger_entries_status(
+            ledger_entries, doc_index_models.DocDBWriteLedgerModel.STATUS_WRITTEN
+        )
+        self.log.info(
+            f"Deleted {len(doc_db_ids_requiring_deletion)} entries from {self.CLASS_NAME}."
+        )
         return response
 
     def upsert_documents_from_context_index_source(
@@ -150,13 +355,6 @@ class DatabaseService(DatabaseBase):
         source: doc_index_models.SourceModel,
         doc_db_ids_requiring_deletion: list[str] = [],
     ):
-        current_entry_count = (
-            self.doc_db_provider.get_index_domain_or_source_entry_count_with_provider(
-                domain_name=source.domain_model.name
-            )
-        )
-        # To ensure that the doc_db_ids are unique
-        current_entry_count += 1 + len(doc_db_ids_requiring_deletion)
         chunks_to_upsert: list[doc_index_models.ChunkModel] = []
         chunk: doc_index_models.ChunkModel
         for doc in upsert_docs:
@@ -164,10 +362,23 @@ class DatabaseService(DatabaseBase):
                 raise ValueError(f"No existing_document_model for doc {doc.title}")
             if not doc.existing_document_model.context_chunks:
                 raise ValueError(f"No context_chunks for doc {doc.title}")
-            for i, chunk in enumerate(doc.existing_document_model.context_chunks):
-                chunk_doc_db_id = f"id-{source.name}-{i + current_entry_count}"
-                chunk.chunk_doc_db_id = chunk_doc_db_id
-                chunks_to_upsert.append(chunk)
+            chunks_to_upsert.extend(doc.existing_document_model.context_chunks)
+
+        # Ledger ids are never reused so they make the doc_db_ids unique without asking the doc db.
+        # The prefix keeps them apart from the id-{source}-{n} ids written before the ledger existed.
+        ledger_entries = self.record_ledger_entries(
+            operation=doc_index_models.DocDBWriteLedgerModel.OPERATION_UPSERT,
+            domain_name=source.domain_model.name,
+            source_name=source.name,
+            doc_db_ids=[None] * len(chunks_to_upsert),
+        )
+        for chunk, ledger_entry in zip(chunks_to_upsert, ledger_entries):
+            chunk.chunk_doc_db_id = f"ledger-{source.name}-{ledger_entry.id}"
+            ledger_entry.doc_db_id = chunk.chunk_doc_db_id
+
+        bm25 = None
+        if self.hybrid_search_enabled:
+            bm25 = self.get_domain_bm25_for_upsert(source.domain_model)
 
         entries_to_upsert = []
         if self.doc_db_provider.DOC_DB_REQUIRES_EMBEDDINGS:
@@ -176,18 +387,192 @@ class DatabaseService(DatabaseBase):
             )
             for chunk in chunks_to_upsert:
                 metadata = chunk.prepare_upsert_metadata()
+                sparse_values = None
+                if bm25 and self.doc_db_provider.SUPPORTS_SPARSE_VALUES:
+                    sparse_values = bm25.encode_documents(chunk.context_chunk)
                 entries_to_upsert.append(
                     self.doc_db_provider.prepare_upsert_for_vectorstore_with_provider(
-                        id=chunk.chunk_doc_db_id, values=chunk.chunk_embedding, metadata=metadata
+                        id=chunk.chunk_doc_db_id,
+                        values=chunk.chunk_embedding,
+                        metadata=metadata,
+                        sparse_values=sparse_values,  # type: ignore
                     )
                 )
         else:
             raise NotImplementedError
 
-        self.upsert(
-            entries_to_upsert=entries_to_upsert,
-            domain_name=source.domain_model.name,
+        try:
+            self.upsert(
+                entries_to_upsert=entries_to_upsert,
+                domain_name=source.domain_model.name,
+            )
+        except Exception:
+            self.set_ledger_entries_status(
+                ledger_entries, doc_index_models.DocDBWriteLedgerModel.STATUS_FAILED
+            )
+            raise
+        self.set_ledger_entries_status(
+            ledger_entries, doc_index_models.DocDBWriteLedgerModel.STATUS_WRITTEN
+        )
+
+    @staticmethod
+    def get_upserted_count(response: Any) -> Optional[int]:
+        if response is None:
+            return None
+        if isinstance(response, dict):
+            return response.get("upserted_count")
+        return getattr(response, "upserted_count", None)
+
+    def record_ledger_entries(
+        self,
+        operation: str,
+        domain_name: str,
+        source_name: Optional[str],
+        doc_db_ids: list[Optional[str]],
+    ) -> list[doc_index_models.DocDBWriteLedgerModel]:
+        session = self.get_index_session()
+        ledger_entries = [
+            doc_index_models.DocDBWriteLedgerModel(
+                doc_db_name=self.doc_db_provider.CLASS_NAME,
+                domain_name=domain_name,
+                source_name=source_name,
+                operation=operation,
+                doc_db_id=doc_db_id,
+                status=doc_index_models.DocDBWriteLedgerModel.STATUS_PENDING,
+            )
+            for doc_db_id in doc_db_ids
+        ]
+        session.add_all(ledger_entries)
+        # Flush so the entries get their ids
+        session.flush()
+        return ledger_entries
+
+    def set_ledger_entries_status(
+        self, ledger_entries: list[doc_index_models.DocDBWriteLedgerModel], status: str
+    ):
+        session = self.get_index_session()
+        if status == doc_index_models.DocDBWriteLedgerModel.STATUS_FAILED:
+            # The caller usually rolls back after a failed write, which would discard these rows.
+            # They're taken out of its session and written by persist_failed_ledger_entries.
+            with self.failed_ledger_entries_lock:
+                for ledger_entry in ledger_entries:
+                    self.failed_ledger_entries.append(
+                        {
+                            "doc_db_name": ledger_entry.doc_db_name,
+                            "domain_name": ledger_entry.domain_name,
+                            "source_name": ledger_entry.source_name,
+                            "operation": ledger_entry.operation,
+                            "doc_db_id": ledger_entry.doc_db_id,
+                            "status": status,
+                        }
+                    )
+                    session.delete(ledger_entry)
+            session.flush()
+            return
+        for ledger_entry in ledger_entries:
+            ledger_entry.status = status
+        session.flush()
+
+    def persist_failed_ledger_entries(self):
+        """
+        Writes failed ledger entries through their own session.
+        Call after the caller's session has committed or rolled back, SQLite allows one writer.
+        """
+        with self.failed_ledger_entries_lock:
+            failed_ledger_entries, self.failed_ledger_entries = self.failed_ledger_entries, []
+        if not failed_ledger_entries:
+            return
+        session = IndexBase.indexbase_open_session()
+        try:
+            session.add_all(
+                [
+                    doc_index_models.DocDBWriteLedgerModel(**failed_ledger_entry)
+                    for failed_ledger_entry in failed_ledger_entries
+                ]
+            )
+        finally:
+            IndexBase.indexbase_close_session(session)
+        self.log.info(f"🔴 Recorded {len(failed_ledger_entries)} failed writes in the ledger.")
+
+    def reconcile_write_ledger(
+        self,
+        domain_name: str,
+        source_name: Optional[str] = None,
+        session: Optional[Session] = None,
+    ) -> dict[str, int]:
+        """
+        Checks written ledger entries against the doc db.
+        Upserts must be fetchable and deletes must not be. Failed entries are kept and verified
+        entries are deleted so the ledger only grows with unresolved writes.
+        """
+        if session is None:
+            session = self.get_index_session()
+        ledger_model = doc_index_models.DocDBWriteLedgerModel
+        query = session.query(ledger_model).filter(
+            ledger_model.doc_db_name == self.doc_db_provider.CLASS_NAME,
+            ledger_model.domain_name == domain_name,
+            ledger_model.status == ledger_model.STATUS_WRITTEN,
+        )
+        if source_name:
+            query = query.filter(ledger_model.source_name == source_name)
+        ledger_entries: list[doc_index_models.DocDBWriteLedgerModel] = query.all()
+
+        counts = {ledger_model.STATUS_VERIFIED: 0, ledger_model.STATUS_FAILED: 0}
+        for i in range(0, len(ledger_entries), self.RECONCILE_FETCH_BATCH_SIZE):
+            batch = ledger_entries[i : i + self.RECONCILE_FETCH_BATCH_SIZE]
+            fetched = (
+                self.doc_db_provider.fetch_by_ids_with_provider(
+                    ids=[ledger_entry.doc_db_id for ledger_entry in batch],
+                    domain_name=domain_name,
+                )
+                or {}
+            )
+            for ledger_entry in batch:
+                expected_in_doc_db = ledger_entry.operation == ledger_model.OPERATION_UPSERT
+                if (ledger_entry.doc_db_id in fetched) == expected_in_doc_db:
+                    ledger_entry.status = ledger_model.STATUS_VERIFIED
+                else:
+                    ledger_entry.status = ledger_model.STATUS_FAILED
+                counts[ledger_entry.status] += 1
+        session.flush()
+        # Includes verified rows left by earlier versions that kept them
+        session.query(ledger_model).filter(
+            ledger_model.doc_db_name == self.doc_db_provider.CLASS_NAME,
+            ledger_model.domain_name == domain_name,
+            ledger_model.status == ledger_model.STATUS_VERIFIED,
+        ).delete(synchronize_session=False)
+        session.commit()
+
+        if counts[ledger_model.STATUS_FAILED]:
+            self.log.info(
+                f"🔴 {counts[ledger_model.STATUS_FAILED]} writes to {self.doc_db_provider.CLASS_NAME} for {domain_name} failed reconciliation."
+            )
+        self.log.info(
+            f"Reconciled {len(ledger_entries)} writes to {self.doc_db_provider.CLASS_NAME} for {domain_name}: {counts}"
         )
+        return counts
+
+    def reconcile_write_ledger_in_background(
+        self, domain_name: str, source_name: Optional[str] = None
+    ) -> Optional[threading.Thread]:
+        if not getattr(self.doc_db_provider.config, "reconcile_writes_in_background", False):
+            return None
+
+        def reconcile():
+            # The calling thread keeps its session so this pass gets its own
+            session = IndexBase.indexbase_open_session()
+            try:
+                self.reconcile_write_ledger(
+                    domain_name=domain_name, source_name=source_name, session=session
+                )
+            except Exception as error:
+                self.log.info(f"Write ledger reconciliation failed: {error}")
+            finally:
+                IndexBase.indexbase_close_session(session)
+
+        thread = threading.Thread(target=reconcile, daemon=True)
+        thread.start()
+        return thread
 
     @classmethod
     def create_doc_index_ui_components(
@@ -0,0 +1,86 @@
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Optional
+
+from services.text_processing.pinecone_io_pinecone_text.sparse import SparseVector
+from services.text_processing.pinecone_io_pinecone_text.sparse.bm25_encoder import BM25Encoder
+
+
+class DomainBM25:
+    """
+    BM25 params fitted per domain and stored as JSON in the local index.
+    Loaded encoders are cached per process and reloaded when the params file changes.
+    """
+
+    BM25_DIR_NAME: str = "bm25"
+    DOC_SPARSE_VALUES_MAX_ENTRIES: int = 50000
+    _encoders: dict[str, tuple[float, BM25Encoder]] = {}
+    # Per encoder LRU of chunk sparse vectors, dropped with the encoder when the domain is refit
+    _doc_sparse_values: "weakref.WeakKeyDictionary[BM25Encoder, OrderedDict[str, SparseVector]]" = (
+        weakref.WeakKeyDictionary()
+    )
+    _lock = threading.Lock()
+
+    def __init__(self, local_index_dir: str):
+        self.bm25_dir = os.path.join(local_index_dir, self.BM25_DIR_NAME)
+
+    def get_params_path(self, domain_name: str) -> str:
+        return os.path.join(self.bm25_dir, f"{domain_name}.json")
+
+    def fit(self, domain_name: str, corpus: list[str]) -> Optional[BM25Encoder]:
+        corpus = [text for text in corpus if text]
+        if not corpus:
+            return None
+        encoder = BM25Encoder().fit(corpus)
+        os.makedirs(self.bm25_dir, exist_ok=True)
+        params_path = self.get_params_path(domain_name)
+        tmp_params_path = f"{params_path}.tmp"
+        encoder.dump(tmp_params_path)
+        os.replace(tmp_params_path, params_path)
+        with DomainBM25._lock:
+            DomainBM25._encoders[params_path] = (os.path.getmtime(params_path), encoder)
+        return encoder
+
+    def load(self, domain_name: str) -> Optional[BM25Encoder]:
+        params_path = self.get_params_path(domain_name)
+        if not os.path.exists(params_path):
+            return None
+        modified_time = os.path.getmtime(params_path)
+        with DomainBM25._lock:
+            cached = DomainBM25._encoders.get(params_path)
+            if cached is not None and cached[0] == modified_time:
+                return cached[1]
+            encoder = BM25Encoder().load(params_path)
+            DomainBM25._encoders[params_path] = (modified_time, encoder)
+        return encoder
+
+    @classmethod
+    def encode_document(
+        cls, encoder: BM25Encoder, chunk_doc_db_id: Optional[str], text: str
+    ) -> SparseVector:
+        """encoder.encode_documents memoized by chunk_doc_db_id for query time scoring."""
+        if not chunk_doc_db_id:
+            return encoder.encode_documents(text)  # type: ignore
+        with cls._lock:
+            doc_sparse_values = cls._doc_sparse_values.setdefault(encoder, OrderedDict())
+            if (doc_sparse := doc_sparse_values.get(chunk_doc_db_id)) is not None:
+                doc_sparse_values.move_to_end(chunk_doc_db_id)
+                return doc_sparse
+        doc_sparse = encoder.encode_documents(text)
+        with cls._lock:
+            doc_sparse_values[chunk_doc_db_id] = doc_sparse  # type: ignore
+            while len(doc_sparse_values) > cls.DOC_SPARSE_VALUES_MAX_ENTRIES:
+                doc_sparse_values.popitem(last=False)
+        return doc_sparse  # type: ignore
+
+
+def sparse_dot(query_sparse: SparseVector, doc_sparse: SparseVector) -> float:
+    doc_weights = dict(zip(doc_sparse["indices"], doc_sparse["values"]))
+    return float(
+        sum(
+            value * doc_weights.get(index, 0.0)
+            for index, value in zip(query_sparse["indices"], query_sparse["values"])
+        )
+    )
@@ -0,0 +1,187 @@
+import json
+import os
+from typing import Optional
+
+import numpy as np
+
+
+def assign_to_centroids(
+    vectors: np.ndarray, centroids: np.ndarray, batch_size: int = 65536
+) -> np.ndarray:
+    """
+    Returns the index of the nearest (L2) centroid for each vector.
+    Works in batches so the distance matrix never grows past batch_size x n_centroids.
+    """
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    centroid_norms = np.sum(centroids**2, axis=1)
+    for start in range(0, len(vectors), batch_size):
+        batch = np.asarray(vectors[start : start + batch_size], dtype=np.float32)
+        # argmin |x - c|^2 == argmax 2x.c - |c|^2
+        assignments[start : start + len(batch)] = np.argmax(
+            2 * batch @ centroids.T - centroid_norms, axis=1
+        )
+    return assignments
+
+
+def train_kmeans(
+    vectors: np.ndarray, n_clusters: int, n_iterations: int = 20, seed: int = 0
+) -> np.ndarray:
+    """
+    Lloyd's k-means. Returns a float32 (n_clusters, dimension) matrix of centroids.
+    """
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if len(vectors) < n_clusters:
+        raise ValueError(f"Need at least {n_clusters} vectors to train {n_clusters} clusters.")
+    centroids = vectors[rng.choice(len(vectors), size=n_clusters, replace=False)].copy()
+    for _ in range(n_iterations):
+        labels = assign_to_centroids(vectors, centroids)
+        counts = np.bincount(labels, minlength=n_clusters)
+        # Sort by label so each cluster's members are contiguous and can be summed with reduceat
+        order = np.argsort(labels, kind="stable")
+        non_empty = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[non_empty]
+        centroids[non_empty] = (
+            np.add.reduceat(vectors[order], starts, axis=0) / counts[non_empty, None]
+        )
+        # Re-seed empty clusters from random vectors rather than letting them die
+        if len(empty := np.flatnonzero(counts == 0)):
+            centroids[empty] = vectors[rng.choice(len(vectors), size=len(empty), replace=False)]
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted file index. Vectors are bucketed by nearest centroid and a query only scans
+    the buckets of its n_probe nearest centroids.
+    Assignments are stored row aligned with the vector store so rows never need to be moved
+    on insert. Centroids and assignments are memory mapped on load.
+    """
+
+    CENTROIDS_FILE_NAME: str = "ivf_centroids.npy"
+    ASSIGNMENTS_FILE_NAME: str = "ivf_assignments.i32"
+    META_FILE_NAME: str = "ivf_meta.json"
+    TRAINING_SAMPLES_PER_LIST: int = 256
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        self.centroids: Optional[np.ndarray] = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.trained_size: int = 0
+        self._list_rows: Optional[np.ndarray] = None
+        self._list_offsets: Optional[np.ndarray] = None
+
+    @property
+    def centroids_path(self) -> str:
+        return os.path.join(self.index_dir, self.CENTROIDS_FILE_NAME)
+
+    @property
+    def assignments_path(self) -> str:
+        return os.path.join(self.index_dir, self.ASSIGNMENTS_FILE_NAME)
+
+    @property
+    def meta_path(self) -> str:
+        return os.path.join(self.index_dir, self.META_FILE_NAME)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    @staticmethod
+    def get_default_n_lists(row_count: int) -> int:
+        return max(1, int(4 * np.sqrt(row_count)))
+
+    def load(self, row_count: int) -> bool:
+        if not os.path.exists(self.centroids_path) or not os.path.exists(self.assignments_path):
+            return False
+        if os.path.getsize(self.assignments_path) != row_count * np.dtype(np.int32).itemsize:
+            # Out of sync with the vector store. The caller retrains.
+            self.reset()
+            return False
+        self.centroids = np.load(self.centroids_path, mmap_mode="r")
+        self.assignments = (
+            np.memmap(self.assignments_path, dtype=np.int32, mode="r", shape=(row_count,))
+            if row_count
+            else np.zeros(0, dtype=np.int32)
+        )
+        with open(self.meta_path, "r", encoding="utf-8") as file:
+            self.trained_size = json.load(file).get("trained_size", 0)
+        self._list_rows = None
+        return True
+
+    def train(self, vectors: np.ndarray, live_rows: np.ndarray, n_lists: int = 0, seed: int = 0):
+        if not n_lists:
+            n_lists = self.get_default_n_lists(len(live_rows))
+        n_lists = min(n_lists, len(live_rows))
+        rng = np.random.default_rng(seed)
+        sample_size = min(len(live_rows), n_lists * self.TRAINING_SAMPLES_PER_LIST)
+        sample_rows = np.sort(rng.choice(live_rows, size=sample_size, replace=False))
+        self.centroids = train_kmeans(vectors[sample_rows], n_clusters=n_lists, seed=seed)
+        self.assignments = assign_to_centroids(vectors, self.centroids)
+        self.trained_size = len(live_rows)
+        self._list_rows = None
+        self.save()
+
+    def add(self, vectors: np.ndarray):
+        if self.centroids is None:
+            return
+        new_assignments = assign_to_centroids(vectors, self.centroids)
+        with open(self.assignments_path, "ab") as file:
+            file.write(new_assignments.tobytes())
+        self.assignments = np.concatenate([self.assignments, new_assignments])
+        self._list_rows = None
+
+    def compact(self, keep_rows: np.ndarray):
+        if self.centroids is None:
+            return
+        self.assignments = np.ascontiguousarray(self.assignments[keep_rows])
+        self._list_rows = None
+        self.save()
+
+    def save(self):
+        if self.centroids is None:
+            return
+        os.makedirs(self.index_dir, exist_ok=True)
+        tmp_centroids_path = f"{self.centroids_path}.tmp"
+        tmp_assignments_path = f"{self.assignments_path}.tmp"
+        with open(tmp_centroids_path, "wb") as file:
+            np.save(file, np.asarray(self.centroids, dtype=np.float32))
+        with open(tmp_assignments_path, "wb") as file:
+            file.write(np.asarray(self.assignments, dtype=np.int32).tobytes())
+        with open(self.meta_path, "w", encoding="utf-8") as file:
+            json.dump({"trained_size": self.trained_size}, file)
+        os.replace(tmp_centroids_path, self.centroids_path)
+        os.replace(tmp_assignments_path, self.assignments_path)
+
+    def reset(self):
+        for path in [self.centroids_path, self.assignments_path, self.meta_path]:
+            if os.path.exists(path):
+                os.remove(path)
+        self.centroids = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.trained_size = 0
+        self._list_rows = None
+
+    def _build_inverted_lists(self):
+        if self.centroids is None:
+            raise ValueError("IVF index must be trained before it can be searched.")
+        counts = np.bincount(self.assignments, minlength=len(self.centroids))
+        self._list_rows = np.argsort(self.assignments, kind="stable").astype(np.int64)
+        self._list_offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    def candidate_rows(self, query_vector: np.ndarray, n_probe: int) -> np.ndarray:
+        if self._list_rows is None:
+            self._build_inverted_lists()
+        if self.centroids is None or self._list_rows is None or self._list_offsets is None:
+            raise ValueError("IVF index must be trained before it can be searched.")
+        centroid_distances = np.sum(self.centroids**2, axis=1) - 2 * (
+            self.centroids @ query_vector
+        )
+        n_probe = min(n_probe, len(self.centroids))
+        probed_lists = np.argpartition(centroid_distances, n_probe - 1)[:n_probe]
+        return np.concatenate(
+            [
+                self._list_rows[self._list_offsets[i] : self._list_offsets[i + 1]]
+                for i in probed_lists
+            ]
+        )
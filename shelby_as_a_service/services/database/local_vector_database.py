@@ -0,0 +1,664 @@
+import json
+import logging
+import os
+import threading
+import typing
+from typing import Any, Literal, Optional
+
+import context_index.doc_index as doc_index_models
+import gradio as gr
+import numpy as np
+from context_index.doc_index.docs.context_docs import RetrievalDoc, load_chunk_embeddings
+from pydantic import BaseModel
+from services.database.database_base import DatabaseBase
+from services.database.ivf_index import IVFIndex
+from services.database.metadata_filter import (
+    MetadataFilter,
+    compile_filters_to_mask,
+    get_stored_metadata_fields,
+)
+from services.database.vector_quantizer import VectorQuantizer
+
+
+class ClassConfigModel(BaseModel):
+    vectorstore_dimension: int = 1536
+    vectorstore_metric: str = "cosine"
+    enabled_doc_embedder_name: str = "openai_embedding"
+    enabled_doc_embedder_config: dict[str, Any] = {}
+    retrieve_n_docs: int = 5
+    index_type: str = "ivf"
+    ivf_n_lists: int = 0  # 0 sizes the index from the number of vectors at training time
+    ivf_n_probe: int = 8  # Higher is better recall, lower is lower latency
+    ivf_min_train_size: int = 10000  # Below this a flat scan is faster anyway
+    compaction_threshold: float = 0.2  # Fraction of tombstoned rows that triggers compaction
+    quantization_type: str = "none"  # "int8" or "pq" to scan compressed codes
+    pq_n_subvectors: int = 96  # Must divide vectorstore_dimension
+    quantization_rerank_multiplier: int = 8  # Candidates re-ranked at full precision per result
+    quantization_min_train_size: int = 10000
+    hybrid_search_enabled: bool = False
+    hybrid_alpha: float = 0.75  # 1 is dense only, 0 is sparse only
+    indexed_metadata: list = [
+        "domain_name",
+        "source_name",
+        "source_type",
+        "date_of_creation",
+    ]
+
+    class Config:
+        extra = "ignore"
+
+
+class LocalVectorStore:
+    """
+    A per domain store of vectors kept as a raw float32 matrix with a sidecar of ids.
+    Row i of the matrix belongs to line i of the ids file and of the metadata file.
+    Only indexed metadata is kept here, as columns for filtering. The rest lives in the SQLite index.
+    All files are append only. Deletes write tombstones and rows are reclaimed by compaction.
+    The matrix is memory mapped so startup cost doesn't grow with the size of the domain.
+    """
+
+    VECTORS_FILE_NAME: str = "vectors.f32"
+    IDS_FILE_NAME: str = "ids.txt"
+    METADATA_FILE_NAME: str = "metadata.jsonl"
+    TOMBSTONES_FILE_NAME: str = "tombstones.txt"
+    SUPPORTED_METRICS: list[str] = ["cosine", "dotproduct", "euclidean"]
+    SUPPORTED_INDEX_TYPES: list[str] = ["flat", "ivf"]
+
+    def __init__(
+        self,
+        store_dir: str,
+        dimension: int,
+        metric: str,
+        index_type: str = "flat",
+        ivf_n_lists: int = 0,
+        ivf_n_probe: int = 8,
+        ivf_min_train_size: int = 10000,
+        compaction_threshold: float = 0.2,
+        indexed_metadata: Optional[list[str]] = None,
+        quantization_type: str = "none",
+        pq_n_subvectors: int = 96,
+        quantization_rerank_multiplier: int = 8,
+        quantization_min_train_size: int = 10000,
+    ):
+        if metric not in self.SUPPORTED_METRICS:
+            raise ValueError(f"Metric {metric} not in {self.SUPPORTED_METRICS}")
+        if index_type not in self.SUPPORTED_INDEX_TYPES:
+            raise ValueError(f"Index type {index_type} not in {self.SUPPORTED_INDEX_TYPES}")
+        self.store_dir = store_dir
+        self.dimension = dimension
+        self.metric = metric
+        self.index_type = index_type
+        self.ivf_n_lists = ivf_n_lists
+        self.ivf_n_probe = ivf_n_probe
+        self.ivf_min_train_size = ivf_min_train_size
+        self.compaction_threshold = compaction_threshold
+        self.quantization_rerank_multiplier = quantization_rerank_multiplier
+        self.quantization_min_train_size = quantization_min_train_size
+        self.indexed_metadata = indexed_metadata or []
+        self.stored_metadata_fields = get_stored_metadata_fields(self.indexed_metadata)
+        self.log = logging.getLogger(__name__)
+        self.lock = threading.RLock()
+        self.ids: list[str] = []
+        self.metadata: list[dict[str, Any]] = []
+        self._metadata_columns: Optional[dict[str, np.ndarray]] = None
+        self.id_to_row: dict[str, int] = {}
+        self.live = np.zeros(0, dtype=bool)
+        self.vectors: np.ndarray = np.zeros((0, dimension), dtype=np.float32)
+        self.ivf_index = IVFIndex(index_dir=store_dir)
+        self.quantizer = VectorQuantizer(
+            index_dir=store_dir,
+            quantization_type=quantization_type,
+            metric=metric,
+            dimension=dimension,
+            n_subvectors=pq_n_subvectors,
+        )
+        self.load()
+
+    @property
+    def vectors_path(self) -> str:
+        return os.path.join(self.store_dir, self.VECTORS_FILE_NAME)
+
+    @property
+    def ids_path(self) -> str:
+        return os.path.join(self.store_dir, self.IDS_FILE_NAME)
+
+    @property
+    def metadata_path(self) -> str:
+        return os.path.join(self.store_dir, self.METADATA_FILE_NAME)
+
+    @property
+    def tombstones_path(self) -> str:
+        return os.path.join(self.store_dir, self.TOMBSTONES_FILE_NAME)
+
+    @property
+    def live_count(self) -> int:
+        return len(self.id_to_row)
+
+    def load(self):
+        if not os.path.exists(self.vectors_path) or not os.path.exists(self.ids_path):
+            return
+        with open(self.ids_path, "r", encoding="utf-8") as file:
+            ids = file.read().splitlines()
+        row_size = self.dimension * np.dtype(np.float32).itemsize
+        if os.path.getsize(self.vectors_path) != len(ids) * row_size:
+            raise ValueError(
+                f"Vector store at {self.store_dir} has {os.path.getsize(self.vectors_path) // row_size} rows but {len(ids)} ids"
+            )
+        self.ids = ids
+        self.metadata = self._load_metadata(len(ids))
+        self._map_vectors()
+        self.live = np.ones(len(ids), dtype=bool)
+        if os.path.exists(self.tombstones_path):
+            with open(self.tombstones_path, "r", encoding="utf-8") as file:
+                self.live[[int(row) for row in file.read().split()]] = False
+        # Later rows win if an id was upserted more than once
+        self.id_to_row = {doc_db_id: row for row, doc_db_id in enumerate(ids) if self.live[row]}
+        if self.index_type == "ivf" and not self.ivf_index.load(row_count=len(ids)):
+            self._maybe_train_ivf_index()
+        if self.quantizer.is_enabled and not self.quantizer.load(row_count=len(ids)):
+            self._maybe_train_quantizer()
+
+    def _load_metadata(self, row_count: int) -> list[dict[str, Any]]:
+        if os.path.exists(self.metadata_path):
+            with open(self.metadata_path, "r", encoding="utf-8") as file:
+                metadata = [json.loads(line) for line in file.read().splitlines()]
+            if len(metadata) == row_count:
+                return metadata
+        # Stores written before metadata was kept, or out of sync. Filters won't match these rows.
+        metadata = [{} for _ in range(row_count)]
+        self._write_metadata(metadata, mode="w")
+        return metadata
+
+    def _write_metadata(self, metadata: list[dict[str, Any]], mode: str = "a"):
+        with open(self.metadata_path, mode, encoding="utf-8") as file:
+            file.writelines(f"{json.dumps(row_metadata)}\n" for row_metadata in metadata)
+
+    def get_metadata_columns(self) -> dict[str, np.ndarray]:
+        """Column per stored field. Numeric fields are float64 with NaN for missing values."""
+        if self._metadata_columns is not None:
+            return self._metadata_columns
+        columns = {}
+        for field in self.stored_metadata_fields:
+            values = [row_metadata.get(field) for row_metadata in self.metadata]
+            if all(
+                isinstance(value, (int, float)) and not isinstance(value, bool)
+                for value in values
+                if value is not None
+            ):
+                columns[field] = np.array(
+                    [np.nan if value is None else value for value in values], dtype=np.float64
+                )
+            else:
+                columns[field] = np.array(values, dtype=object)
+        self._metadata_columns = columns
+        return columns
+
+    def get_filter_mask(self, filters: Optional[list[MetadataFilter]]) -> Optional[np.ndarray]:
+        return compile_filters_to_mask(
+            filters=filters,
+            columns=self.get_metadata_columns(),
+            row_count=len(self.ids),
+            indexed_metadata=self.indexed_metadata,
+        )
+
+    def _map_vectors(self):
+        if self.ids:
+            self.vectors = np.memmap(
+                self.vectors_path, dtype=np.float32, mode="r", shape=(len(self.ids), self.dimension)
+            )
+        else:
+            self.vectors = np.zeros((0, self.dimension), dtype=np.float32)
+
+    def prepare_vectors(self, vectors: list[list[float]] | np.ndarray) -> np.ndarray:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(1, -1)
+        if matrix.shape[1] != self.dimension:
+            raise ValueError(
+                f"Vectors have dimension {matrix.shape[1]} but store expects {self.dimension}"
+            )
+        if self.metric == "cosine":
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1
+            matrix = matrix / norms
+        return np.ascontiguousarray(matrix, dtype=np.float32)
+
+    def upsert(
+        self,
+        ids: list[str],
+        vectors: list[list[float]],
+        metadata: Optional[list[dict[str, Any]]] = None,
+    ) -> int:
+        matrix = self.prepare_vectors(vectors)
+        if metadata is None:
+            metadata = [{} for _ in ids]
+        metadata = [
+            {
+                field: row_metadata[field]
+                for field in self.stored_metadata_fields
+                if field in row_metadata
+            }
+            for row_metadata in metadata
+        ]
+        with self.lock:
+            # Existing ids are tombstoned and re-appended so rows are never rewritten in place
+            self._tombstone_rows(
+                [row for doc_db_id in ids if (row := self.id_to_row.get(doc_db_id)) is not None]
+            )
+            os.makedirs(self.store_dir, exist_ok=True)
+            first_new_row = len(self.ids)
+            with open(self.vectors_path, "ab") as file:
+                file.write(matrix.tobytes())
+            with open(self.ids_path, "a", encoding="utf-8") as file:
+                file.writelines(f"{doc_db_id}\n" for doc_db_id in ids)
+            self._write_metadata(metadata)
+            self.ids.extend(ids)
+            self.metadata.extend(metadata)
+            self._metadata_columns = None
+            for i, doc_db_id in enumerate(ids):
+                self.id_to_row[doc_db_id] = first_new_row + i
+            self.live = np.concatenate([self.live, np.ones(len(ids), dtype=bool)])
+            self._map_vectors()
+            if self.index_type == "ivf":
+                if self.ivf_index.is_trained:
+                    self.ivf_index.add(matrix)
+                else:
+                    self._maybe_train_ivf_index()
+            if self.quantizer.is_trained:
+                self.quantizer.add(matrix)
+            elif self.quantizer.is_enabled:
+                self._maybe_train_quantizer()
+            self._maybe_compact()
+        return len(ids)
+
+    def delete(self, ids: list[str]) -> int:
+        with self.lock:
+            rows = [
+                row for doc_db_id in ids if (row := self.id_to_row.pop(doc_db_id, None)) is not None
+            ]
+            self._tombstone_rows(rows)
+            self._maybe_compact()
+        return len(rows)
+
+    def _tombstone_rows(self, rows: list[int]):
+        if not rows:
+            return
+        self.live[rows] = False
+        with open(self.tombstones_path, "a", encoding="utf-8") as file:
+            file.writelines(f"{row}\n" for row in rows)
+
+    def _maybe_train_ivf_index(self):
+        if self.live_count < max(self.ivf_min_train_size, 1):
+            return
+        self.ivf_index.train(
+            vectors=self.vectors, live_rows=np.flatnonzero(self.live), n_lists=self.ivf_n_lists
+        )
+
+    def _maybe_train_quantizer(self):
+        if self.live_count < max(self.quantization_min_train_size, 1):
+            return
+        # Runs after upserts are on disk, so a failure leaves the store on exact search
+        try:
+            self.train_quantizer()
+        except Exception as error:
+            self.quantizer.reset()
+            self.log.info(f"Quantizer training failed, searching without it: {error}")
+
+    def train_quantizer(self, training_vectors: Optional[np.ndarray] = None):
+        """Trains on training_vectors if given, otherwise on the live rows of the store."""
+        with self.lock:
+            if training_vectors is None:
+                training_vectors = self.vectors[np.flatnonzero(self.live)]
+            else:
+                training_vectors = self.prepare_vectors(training_vectors)
+            self.quantizer.train(
+                training_vectors=training_vectors, vectors=self.vectors, live_count=self.live_count
+            )
+
+    def _maybe_compact(self):
+        if not len(self.live):
+            return
+        if 1 - (self.live_count / len(self.live)) > self.compaction_threshold:
+            self.compact()
+
+    def compact(self):
+        with self.lock:
+            keep_rows = np.flatnonzero(self.live)
+            tmp_vectors_path = f"{self.vectors_path}.tmp"
+            tmp_ids_path = f"{self.ids_path}.tmp"
+            with open(tmp_vectors_path, "wb") as file:
+                file.write(np.ascontiguousarray(self.vectors[keep_rows]).tobytes())
+            ids = [self.ids[row] for row in keep_rows]
+            with open(tmp_ids_path, "w", encoding="utf-8") as file:
+                file.writelines(f"{doc_db_id}\n" for doc_db_id in ids)
+            metadata = [self.metadata[row] for row in keep_rows]
+            tmp_metadata_path = f"{self.metadata_path}.tmp"
+            with open(tmp_metadata_path, "w", encoding="utf-8") as file:
+                file.writelines(f"{json.dumps(row_metadata)}\n" for row_metadata in metadata)
+            # Drop the memmap before replacing the file underneath it
+            self.vectors = np.zeros((0, self.dimension), dtype=np.float32)
+            os.replace(tmp_vectors_path, self.vectors_path)
+            os.replace(tmp_ids_path, self.ids_path)
+            os.replace(tmp_metadata_path, self.metadata_path)
+            if os.path.exists(self.tombstones_path):
+                os.remove(self.tombstones_path)
+
+            self.ids = ids
+            self.metadata = metadata
+            self._metadata_columns = None
+            self.id_to_row = {doc_db_id: row for row, doc_db_id in enumerate(ids)}
+            self.live = np.ones(len(ids), dtype=bool)
+            self._map_vectors()
+            if self.index_type == "ivf":
+                # Clusters drift as the domain grows, so retrain once it has outgrown its training set
+                if self.ivf_index.is_trained and len(ids) <= 4 * self.ivf_index.trained_size:
+                    self.ivf_index.compact(keep_rows)
+                else:
+                    self.ivf_index.reset()
+                    self._maybe_train_ivf_index()
+            if self.quantizer.is_trained and len(ids) <= 4 * self.quantizer.trained_size:
+                self.quantizer.compact(keep_rows)
+            elif self.quantizer.is_enabled:
+                self.quantizer.reset()
+                self._maybe_train_quantizer()
+
+    def score(self, query_vectors: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+        if self.metric == "euclidean":
+            # Negated squared distance so that higher is always better
+            return -(
+                np.sum(query_vectors**2, axis=1, keepdims=True)
+                - 2 * query_vectors @ vectors.T
+                + np.sum(vectors**2, axis=1)
+            )
+        return query_vectors @ vectors.T
+
+    def _top_k(
+        self, scores: np.ndarray, rows: Optional[np.ndarray], top_k: int
+    ) -> list[tuple[str, float]]:
+        top_k = min(top_k, len(scores))
+        if top_k < 1:
+            return []
+        # argpartition finds the top_k unordered, then only those are sorted
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        if rows is not None:
+            top_rows = rows[top]
+        else:
+            top_rows = top
+        return [
+            (self.ids[row], float(scores[i]))
+            for i, row in zip(top, top_rows)
+            if scores[i] != -np.inf
+        ]
+
+    def query(
+        self,
+        query_vectors: list[list[float]] | np.ndarray,
+        top_k: int,
+        filters: Optional[list[MetadataFilter]] = None,
+    ) -> list[list[tuple[str, float]]]:
+        queries = self.prepare_vectors(query_vectors)
+        with self.lock:
+            if not self.live_count:
+                return [[] for _ in range(len(queries))]
+            allowed = self.live
+            if (filter_mask := self.get_filter_mask(filters)) is not None:
+                allowed = self.live & filter_mask
+            allowed_count = int(np.count_nonzero(allowed))
+
+            if self.index_type == "ivf" and self.ivf_index.is_trained:
+                if filter_mask is not None and allowed_count <= self.ivf_min_train_size:
+                    # Selective filters leave too few rows in the probed lists, and exact search is cheap
+                    return self._rank_rows(queries, np.flatnonzero(allowed), top_k)
+                results = []
+                for query_vector in queries:
+                    rows = self.ivf_index.candidate_rows(query_vector, n_probe=self.ivf_n_probe)
+                    results.extend(
+                        self._rank_rows(query_vector[None, :], rows[allowed[rows]], top_k)
+                    )
+                return results
+
+            return self._rank_rows(queries, np.flatnonzero(allowed), top_k)
+
+    def _rank_rows(
+        self, queries: np.ndarray, rows: np.ndarray, top_k: int
+    ) -> list[list[tuple[str, float]]]:
+        if not self.quantizer.is_trained:
+            scores = self.score(queries, self.vectors[rows])
+            return [self._top_k(query_scores, rows, top_k) for query_scores in scores]
+        # Scan the codes, then only read the best candidates at full precision
+        approximate_scores = self.quantizer.score(queries, rows)
+        n_candidates = min(len(rows), top_k * max(self.quantization_rerank_multiplier, 1))
+        results = []
+        for query_vector, query_scores in zip(queries, approximate_scores):
+            if n_candidates < 1:
+                results.append([])
+                continue
+            candidates = np.argpartition(-query_scores, n_candidates - 1)[:n_candidates]
+            candidate_rows = np.sort(rows[candidates])
+            scores = self.score(query_vector[None, :], self.vectors[candidate_rows])[0]
+            results.append(self._top_k(scores, candidate_rows, top_k))
+        return results
+
+    def fetch(self, ids: list[str]) -> dict[str, list[float]]:
+        with self.lock:
+            return {
+                doc_db_id: self.vectors[row].tolist()
+                for doc_db_id in ids
+                if (row := self.id_to_row.get(doc_db_id)) is not None
+            }
+
+
+class LocalVectorDatabase(DatabaseBase):
+    class_name = Literal["local_vector_database"]
+    CLASS_NAME: str = typing.get_args(class_name)[0]
+    CLASS_UI_NAME: str = "Local Vector Database"
+    DOC_DB_REQUIRES_EMBEDDINGS: bool = True
+    VECTOR_STORE_DIR_NAME: str = "vector_store"
+
+    class_config_model = ClassConfigModel
+    config: ClassConfigModel
+
+    # Shared across instances so each domain's matrix is only read from disk once per process
+    _domain_stores: dict[str, LocalVectorStore] = {}
+    _domain_stores_lock = threading.Lock()
+
+    def __init__(
+        self,
+        vectorstore_dimension: Optional[int] = None,
+        vectorstore_metric: Optional[str] = None,
+        retrieve_n_docs: Optional[int] = None,
+        context_index_config: dict[str, Any] = {},
+        config_file_dict: dict[str, Any] = {},
+        **kwargs,
+    ):
+        super().__init__(
+            vectorstore_dimension=vectorstore_dimension,
+            vectorstore_metric=vectorstore_metric,
+            retrieve_n_docs=retrieve_n_docs,
+            context_index_config=context_index_config,
+            config_file_dict=config_file_dict,
+            **kwargs,
+        )
+
+    def get_domain_store(self, domain_name: str) -> LocalVectorStore:
+        store_dir = os.path.join(self.local_index_dir, self.VECTOR_STORE_DIR_NAME, domain_name)
+        with LocalVectorDatabase._domain_stores_lock:
+            if (store := LocalVectorDatabase._domain_stores.get(store_dir)) is None:
+                store = LocalVectorStore(
+                    store_dir=store_dir,
+                    dimension=self.config.vectorstore_dimension,
+                    metric=self.config.vectorstore_metric,
+                    index_type=self.config.index_type,
+                    ivf_n_lists=self.config.ivf_n_lists,
+                    ivf_n_probe=self.config.ivf_n_probe,
+                    ivf_min_train_size=self.config.ivf_min_train_size,
+                    compaction_threshold=self.config.compaction_threshold,
+                    indexed_metadata=self.config.indexed_metadata,
+                    quantization_type=self.config.quantization_type,
+                    pq_n_subvectors=self.config.pq_n_subvectors,
+                    quantization_rerank_multiplier=self.config.quantization_rerank_multiplier,
+                    quantization_min_train_size=self.config.quantization_min_train_size,
+                )
+                LocalVectorDatabase._domain_stores[store_dir] = store
+        return store
+
+    def train_domain_quantizer(self, domain_name: str):
+        """Trains the domain's quantizer on the chunk embeddings stored in the index."""
+        _, training_vectors = load_chunk_embeddings(
+            self.get_index_session(), domain_name=domain_name
+        )
+        if not len(training_vectors):
+            raise ValueError(f"No chunk embeddings in the index for domain {domain_name}")
+        self.get_domain_store(domain_name).train_quantizer(training_vectors)
+
+    def get_index_domain_or_source_entry_count_with_provider(
+        self, source_name: Optional[str] = None, domain_name: Optional[str] = None
+    ) -> int:
+        if source_name:
+            source_doc_db_ids = [
+                row[0]
+                for row in self.get_index_session()
+                .query(doc_index_models.ChunkModel.chunk_doc_db_id)
+                .join(doc_index_models.DocumentModel)
+                .join(doc_index_models.SourceModel)
+                .filter(doc_index_models.SourceModel.name == source_name)
+                .all()
+            ]
+            if not domain_name:
+                raise ValueError("Must provide domain_name with source_name")
+            store = self.get_domain_store(domain_name)
+            return sum(1 for doc_db_id in source_doc_db_ids if doc_db_id in store.id_to_row)
+        elif domain_name:
+            return self.get_domain_store(domain_name).live_count
+        else:
+            raise ValueError("Must provide either source_name or domain_name")
+
+    def clear_existing_entries_by_id_with_provider(
+        self, doc_db_ids_requiring_deletion: list[str], domain_name: str
+    ) -> bool:
+        self.get_domain_store(domain_name).delete(doc_db_ids_requiring_deletion)
+        return True
+
+    def prepare_upsert_for_vectorstore_with_provider(
+        self,
+        id: str,
+        values: Optional[list[float]],
+        metadata: dict[str, Any],
+        sparse_values: Optional[dict[str, Any]] = None,
+    ) -> dict[str, Any]:
+        if not values:
+            raise ValueError(f"Must provide values for {self.CLASS_NAME}")
+        # The rest of the metadata is already persisted in the SQLite index with the chunk
+        stored_metadata_fields = get_stored_metadata_fields(self.config.indexed_metadata)
+        return {
+            "id": id,
+            "values": values,
+            "metadata": {
+                field: value for field, value in metadata.items() if field in stored_metadata_fields
+            },
+        }
+
+    def upsert_with_provider(
+        self,
+        entries_to_upsert: list[dict[str, Any]],
+        domain_name: str,
+    ) -> Any:
+        upserted_count = self.get_domain_store(domain_name).upsert(
+            ids=[entry["id"] for entry in entries_to_upsert],
+            vectors=[entry["values"] for entry in entries_to_upsert],
+            metadata=[entry.get("metadata", {}) for entry in entries_to_upsert],
+        )
+        return {"upserted_count": upserted_count}
+
+    def query_by_terms_with_provider(
+        self,
+        search_terms: list[float],
+        domain_name: str,
+        retrieve_n_docs: Optional[int] = None,
+        filters: Optional[list[MetadataFilter]] = None,
+    ) -> list[RetrievalDoc]:
+        return self.query_many_with_provider(
+            search_terms=[search_terms],
+            domain_name=domain_name,
+            retrieve_n_docs=retrieve_n_docs,
+            filters=filters,
+        )[0]
+
+    def query_many_with_provider(
+        self,
+        search_terms: list[list[float]],
+        domain_name: str,
+        retrieve_n_docs: Optional[int] = None,
+        filters: Optional[list[MetadataFilter]] = None,
+    ) -> list[list[RetrievalDoc]]:
+        if retrieve_n_docs is None:
+            top_k = self.config.retrieve_n_docs
+        else:
+            top_k = retrieve_n_docs
+
+        # All terms are scored against the domain's matrix in a single matrix multiply
+        matches_per_term = self.get_domain_store(domain_name).query(
+            query_vectors=search_terms, top_k=top_k, filters=filters
+        )
+        return self.hydrate_matches(matches_per_term)
+
+    def fetch_by_ids_with_provider(
+        self,
+        ids: list[str],
+        domain_name: str,
+    ) -> dict[str, Any] | None:
+        vectors = self.get_domain_store(domain_name).fetch(ids)
+        if not vectors:
+            self.log.info(f"Vectors not found for ids: {ids}")
+            return None
+        return {
+            doc_db_id: {"id": doc_db_id, "values": values} for doc_db_id, values in vectors.items()
+        }
+
+    def create_provider_management_settings_ui(self):
+        ui_components = {}
+
+        ui_components["vectorstore_dimension"] = gr.Number(
+            value=self.config.vectorstore_dimension,
+            label="vectorstore_dimension",
+            interactive=True,
+            min_width=0,
+        )
+        ui_components["vectorstore_metric"] = gr.Dropdown(
+            value=self.config.vectorstore_metric,
+            choices=LocalVectorStore.SUPPORTED_METRICS,
+            label="vectorstore_metric",
+            interactive=True,
+            min_width=0,
+        )
+        ui_components["index_type"] = gr.Dropdown(
+            value=self.config.index_type,
+            choices=LocalVectorStore.SUPPORTED_INDEX_TYPES,
+            label="index_type",
+            interactive=True,
+            min_width=0,
+        )
+        ui_components["quantization_type"] = gr.Dropdown(
+            value=self.config.quantization_type,
+            choices=VectorQuantizer.SUPPORTED_QUANTIZATION_TYPES,
+            label="quantization_type",
+            info="Scan int8 or product quantized codes and re-rank at full precision.",
+            interactive=True,
+            min_width=0,
+        )
+        ui_components["ivf_n_probe"] = gr.Number(
+            value=self.config.ivf_n_probe,
+            label="ivf_n_probe",
+            info="Clusters scanned per query. Higher is better recall, lower is faster.",
+            interactive=True,
+            min_width=0,
+        )
+
+        return ui_components
+
+    @classmethod
+    def create_provider_ui_components(cls, config_model: ClassConfigModel, visibility: bool = True):
+        ui_components = {}
+
+        return ui_components
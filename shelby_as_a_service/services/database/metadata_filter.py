@@ -0,0 +1,115 @@
+from datetime import datetime, timezone
+from typing import Any, Literal, Optional
+
+import numpy as np
+from pydantic import BaseModel
+
+FilterOperator = Literal["eq", "ne", "in", "nin", "gt", "gte", "lt", "lte"]
+# Range filters need numbers, so dates are filtered on a timestamp stored alongside the date string
+TIMESTAMP_FIELDS: dict[str, str] = {"date_of_creation": "date_of_creation_timestamp"}
+
+
+class MetadataFilter(BaseModel):
+    """
+    A provider neutral filter on a single indexed metadata field.
+    Datetime values are compared as UTC timestamps.
+    Entries upserted before the timestamp field existed will not match date filters.
+    """
+
+    field: str
+    operator: FilterOperator = "eq"
+    value: Any
+
+    @property
+    def target_field(self) -> str:
+        if self.field in TIMESTAMP_FIELDS and self.has_datetime_value:
+            return TIMESTAMP_FIELDS[self.field]
+        return self.field
+
+    @property
+    def has_datetime_value(self) -> bool:
+        if isinstance(self.value, (list, tuple)):
+            return any(isinstance(value, datetime) for value in self.value)
+        return isinstance(self.value, datetime)
+
+    @property
+    def target_value(self) -> Any:
+        if isinstance(self.value, (list, tuple)):
+            return [to_filter_value(value) for value in self.value]
+        return to_filter_value(self.value)
+
+    def validate_field(self, indexed_metadata: list[str]):
+        if self.field not in indexed_metadata:
+            raise ValueError(f"Can't filter on {self.field}. Indexed metadata: {indexed_metadata}")
+        if self.operator in ["in", "nin"] and not isinstance(self.value, (list, tuple)):
+            raise ValueError(f"Operator {self.operator} requires a list value.")
+
+    def to_pinecone(self) -> dict[str, Any]:
+        return {self.target_field: {f"${self.operator}": self.target_value}}
+
+    def to_mask(self, column: np.ndarray) -> np.ndarray:
+        value = self.target_value
+        if self.operator == "eq":
+            return column == value
+        if self.operator == "ne":
+            return column != value
+        if self.operator == "in":
+            return np.isin(column, value)
+        if self.operator == "nin":
+            return ~np.isin(column, value)
+        if column.dtype == object:
+            raise ValueError(f"Range operator {self.operator} requires a numeric field.")
+        with np.errstate(invalid="ignore"):
+            if self.operator == "gt":
+                return column > value
+            if self.operator == "gte":
+                return column >= value
+            if self.operator == "lt":
+                return column < value
+            return column <= value
+
+
+def to_filter_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        # The index stores naive datetimes in UTC
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return value
+
+
+def get_stored_metadata_fields(indexed_metadata: list[str]) -> list[str]:
+    return indexed_metadata + [
+        TIMESTAMP_FIELDS[field] for field in indexed_metadata if field in TIMESTAMP_FIELDS
+    ]
+
+
+def compile_filters_to_pinecone(
+    filters: Optional[list[MetadataFilter]], indexed_metadata: list[str]
+) -> Optional[dict[str, Any]]:
+    if not filters:
+        return None
+    for metadata_filter in filters:
+        metadata_filter.validate_field(indexed_metadata)
+    if len(filters) == 1:
+        return filters[0].to_pinecone()
+    return {"$and": [metadata_filter.to_pinecone() for metadata_filter in filters]}
+
+
+def compile_filters_to_mask(
+    filters: Optional[list[MetadataFilter]],
+    columns: dict[str, np.ndarray],
+    row_count: int,
+    indexed_metadata: list[str],
+) -> Optional[np.ndarray]:
+    """Returns a boolean row mask, or None if there's nothing to filter on."""
+    if not filters:
+        return None
+    mask = np.ones(row_count, dtype=bool)
+    for metadata_filter in filters:
+        metadata_filter.validate_field(indexed_metadata)
+        if (column := columns.get(metadata_filter.target_field)) is None:
+            # Nothing was stored for this field so no row can match
+            return np.zeros(row_count, dtype=bool)
+        mask &= metadata_filter.to_mask(column)
+    return mask
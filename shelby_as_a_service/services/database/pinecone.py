@@ -1,13 +1,24 @@
+import json
 import os
+import random
+import threading
+import time
 import typing
-from typing import Any, Literal, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Iterator, Literal, Optional
 
 import gradio as gr
 import pinecone
+import services.text_processing.text_utils as text_utils
 from context_index.doc_index.docs.context_docs import RetrievalDoc
 from pinecone import FetchResponse, QueryResponse
 from pydantic import BaseModel, ValidationError
 from services.database.database_base import DatabaseBase
+from services.database.metadata_filter import (
+    MetadataFilter,
+    compile_filters_to_pinecone,
+    get_stored_metadata_fields,
+)
 
 
 class ClassConfigModel(BaseModel):
@@ -15,11 +26,24 @@ class ClassConfigModel(BaseModel):
     index_name: str = "shelby-as-a-service"
     vectorstore_dimension: int = 1536
     upsert_batch_size: int = 20
+    upsert_pipelined: bool = False
+    upsert_max_request_bytes: int = 1_500_000
+    upsert_max_batch_size: int = 100
+    upsert_max_concurrent_requests: int = 4
+    upsert_max_retries: int = 3
+    upsert_retry_backoff_seconds: float = 1.0
     vectorstore_metric: str = "cosine"
     vectorstore_pod_type: str = "p1"
     enabled_doc_embedder_name: str = "openai_embedding"
     enabled_doc_embedder_config: dict[str, Any] = {}
     retrieve_n_docs: int = 5
+    query_max_concurrent_requests: int = 8
+    reconcile_writes_in_background: bool = False
+    hybrid_search_enabled: bool = False  # Requires vectorstore_metric dotproduct, checked on init
+    hybrid_alpha: float = 0.75  # 1 is dense only, 0 is sparse only
+    # Ingest refits a domain's BM25 once its chunk count has moved this much since the last fit
+    bm25_refit_change_threshold: float = 0.2
+    id_only_metadata: bool = False  # Store only filterable fields and hydrate docs from the index
     indexed_metadata: list = [
         "domain_name",
         "source_name",
@@ -37,6 +61,7 @@ class PineconeDatabase(DatabaseBase):
     CLASS_UI_NAME: str = "Pinecone Database"
     REQUIRED_SECRETS: list[str] = ["pinecone_api_key"]
     DOC_DB_REQUIRES_EMBEDDINGS: bool = True
+    SUPPORTS_SPARSE_VALUES: bool = True
 
     class_config_model = ClassConfigModel
     config: ClassConfigModel
@@ -70,6 +95,11 @@ class PineconeDatabase(DatabaseBase):
             config_file_dict=config_file_dict,
             **kwargs,
         )
+        if self.config.hybrid_search_enabled and self.config.vectorstore_metric != "dotproduct":
+            raise ValueError(
+                "hybrid_search_enabled requires vectorstore_metric dotproduct, "
+                f"not {self.config.vectorstore_metric}."
+            )
 
     def init_provider(self) -> pinecone.Index:
         if self.pinecone_index is not None:
@@ -87,6 +117,13 @@ class PineconeDatabase(DatabaseBase):
             self.create_index()
             indexes = pinecone.list_indexes()
             self.log.info(f"Created index: {indexes}")
+        if self.config.hybrid_search_enabled:
+            # The config can claim dotproduct for an index that was created with another metric
+            if (metric := pinecone.describe_index(self.config.index_name).metric) != "dotproduct":
+                raise ValueError(
+                    f"hybrid_search_enabled requires a dotproduct index. "
+                    f"{self.config.index_name} uses {metric}."
+                )
         self.pinecone_index = pinecone.Index(self.config.index_name)
         return self.pinecone_index
 
@@ -150,14 +187,24 @@ class PineconeDatabase(DatabaseBase):
         id: str,
         values: Optional[list[float]],
         metadata: dict[str, Any],
+        sparse_values: Optional[dict[str, Any]] = None,
     ) -> dict[str, Any]:
         if not values:
             raise ValueError(f"Must provide values for {self.CLASS_NAME}")
-        return {
+        if self.config.id_only_metadata:
+            # The chunk text, title and uri are already persisted in the index with the chunk
+            stored_metadata_fields = get_stored_metadata_fields(self.config.indexed_metadata)
+            metadata = {
+                field: value for field, value in metadata.items() if field in stored_metadata_fields
+            }
+        entry = {
             "id": id,
             "values": values,
             "metadata": metadata,
         }
+        if sparse_values and sparse_values.get("indices"):
+            entry["sparse_values"] = sparse_values
+        return entry
 
     def upsert_with_provider(
         self,
@@ -165,6 +212,10 @@ class PineconeDatabase(DatabaseBase):
         domain_name: str,
     ) -> Any:
         pinecone_index = self.init_provider()
+        if self.config.upsert_pipelined:
+            return self.pipelined_upsert(
+                entries_to_upsert=entries_to_upsert, domain_name=domain_name
+            )
         return pinecone_index.upsert(
             vectors=entries_to_upsert,
             namespace=domain_name,
@@ -172,29 +223,164 @@ class PineconeDatabase(DatabaseBase):
             show_progress=True,
         )
 
+    def split_upsert_batches(
+        self, entries_to_upsert: list[dict[str, Any]]
+    ) -> Iterator[tuple[list[dict[str, Any]], int]]:
+        """Yields (batch, payload_bytes) with each batch under the request size and count limits."""
+        batch: list[dict[str, Any]] = []
+        batch_bytes = 0
+        for entry in entries_to_upsert:
+            entry_bytes = len(json.dumps(entry, default=str))
+            if batch and (
+                batch_bytes + entry_bytes > self.config.upsert_max_request_bytes
+                or len(batch) >= self.config.upsert_max_batch_size
+            ):
+                yield batch, batch_bytes
+                batch, batch_bytes = [], 0
+            batch.append(entry)
+            batch_bytes += entry_bytes
+        if batch:
+            yield batch, batch_bytes
+
+    def upsert_batch_with_retries(
+        self, batch: list[dict[str, Any]], domain_name: str
+    ) -> tuple[int, int, Optional[str]]:
+        """Returns (upserted_count, attempts, error)."""
+        pinecone_index = self.init_provider()
+        error = None
+        for attempt in range(1, self.config.upsert_max_retries + 2):
+            try:
+                response = pinecone_index.upsert(vectors=batch, namespace=domain_name)
+                return response.get("upserted_count", 0), attempt, None
+            except Exception as e:
+                error = str(e)
+                if attempt > self.config.upsert_max_retries:
+                    break
+                backoff = self.config.upsert_retry_backoff_seconds * 2 ** (attempt - 1)
+                self.log.info(f"Upsert batch failed: {error}. Retrying in {backoff:.1f}s.")
+                time.sleep(backoff * (1 + random.random()))
+        return 0, self.config.upsert_max_retries + 1, error
+
+    def pipelined_upsert(
+        self, entries_to_upsert: list[dict[str, Any]], domain_name: str
+    ) -> dict[str, Any]:
+        max_workers = max(1, self.config.upsert_max_concurrent_requests)
+        # Batches are sized lazily so at most two batches per worker are held in flight
+        in_flight = threading.BoundedSemaphore(max_workers * 2)
+        futures: list[tuple[int, int, int, Future]] = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for batch_index, (batch, payload_bytes) in enumerate(
+                self.split_upsert_batches(entries_to_upsert)
+            ):
+                in_flight.acquire()
+                future = executor.submit(self.upsert_batch_with_retries, batch, domain_name)
+                future.add_done_callback(lambda _: in_flight.release())
+                futures.append((batch_index, len(batch), payload_bytes, future))
+
+        batches = []
+        for batch_index, batch_size, payload_bytes, future in futures:
+            upserted_count, attempts, error = future.result()
+            batches.append(
+                {
+                    "batch_index": batch_index,
+                    "batch_size": batch_size,
+                    "payload_bytes": payload_bytes,
+                    "upserted_count": upserted_count,
+                    "attempts": attempts,
+                    "error": error,
+                }
+            )
+            if error:
+                self.log.info(f"🔴 Upsert batch {batch_index} failed after {attempts} attempts.")
+        return {
+            "upserted_count": sum(batch["upserted_count"] for batch in batches),
+            "batches": batches,
+        }
+
     def query_by_terms_with_provider(
         self,
         search_terms: list[float],
         domain_name: str,
         retrieve_n_docs: Optional[int] = None,
+        filters: Optional[list[MetadataFilter]] = None,
+        sparse_vector: Optional[dict[str, Any]] = None,
     ) -> list[RetrievalDoc]:
-        pinecone_index = self.init_provider()
-        filter = None  # Need to implement
-        if retrieve_n_docs is None:
-            top_k = self.config.retrieve_n_docs
-        else:
-            top_k = retrieve_n_docs
+        return self.query_many_with_provider(
+            search_terms=[search_terms],
+            domain_name=domain_name,
+            retrieve_n_docs=retrieve_n_docs,
+            filters=filters,
+            sparse_search_terms=[sparse_vector],
+        )[0]
 
-        response: QueryResponse = pinecone_index.query(
+    def query_index(
+        self,
+        search_terms: list[float],
+        domain_name: str,
+        top_k: int,
+        filter: Optional[dict[str, Any]] = None,
+        sparse_vector: Optional[dict[str, Any]] = None,
+    ) -> QueryResponse:
+        pinecone_index = self.init_provider()
+        return pinecone_index.query(
             top_k=top_k,
             include_values=False,
             namespace=domain_name,
-            include_metadata=True,
+            # With id only metadata the docs are hydrated from the index instead
+            include_metadata=not self.config.id_only_metadata,
             filter=filter,  # type: ignore
             vector=search_terms,
+            sparse_vector=sparse_vector if sparse_vector and sparse_vector.get("indices") else None,
         )
 
+    def query_many_with_provider(
+        self,
+        search_terms: list[list[float]],
+        domain_name: str,
+        retrieve_n_docs: Optional[int] = None,
+        filters: Optional[list[MetadataFilter]] = None,
+        sparse_search_terms: Optional[list[Optional[dict[str, Any]]]] = None,
+    ) -> list[list[RetrievalDoc]]:
+        if not search_terms:
+            return []
+        if sparse_search_terms is None:
+            sparse_search_terms = [None] * len(search_terms)
+        if retrieve_n_docs is None:
+            top_k = self.config.retrieve_n_docs
+        else:
+            top_k = retrieve_n_docs
+        filter = compile_filters_to_pinecone(filters, self.config.indexed_metadata)
+
+        # The index client is shared by the worker threads so initialize it before fanning out
+        self.init_provider()
+        max_workers = max(1, min(self.config.query_max_concurrent_requests, len(search_terms)))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(
+                    self.query_index,
+                    search_terms=search_term,
+                    domain_name=domain_name,
+                    top_k=top_k,
+                    filter=filter,
+                    sparse_vector=sparse_search_term,
+                )
+                for search_term, sparse_search_term in zip(search_terms, sparse_search_terms)
+            ]
+            responses: list[QueryResponse] = [future.result() for future in futures]
+
+        if self.config.id_only_metadata:
+            # Hydrated here rather than in the workers since the index session isn't thread safe
+            return self.hydrate_matches(
+                [
+                    [(m.get("id"), m.get("score", 0)) for m in response.get("matches", [])]
+                    for response in responses
+                ]
+            )
+        return [self.parse_query_response(response) for response in responses]
+
+    def parse_query_response(self, response: QueryResponse) -> list[RetrievalDoc]:
         returned_documents = []
+        encoding_name = text_utils.get_encoding_name()
         matches: list[dict] = response.get("matches", {})
         for m in matches:
             metadata: dict[str, Any] = m.get("metadata", {})
@@ -205,11 +391,13 @@ class PineconeDatabase(DatabaseBase):
                     raise ValueError(
                         f"Neither 'context_chunk' nor 'content' found in metadata: {metadata}"
                     )
+                token_counts = json.loads(metadata.get("content_token_counts") or "{}")
                 returned_documents.append(
                     RetrievalDoc(
                         domain_name=metadata.get("domain_name"),
                         source_name=metadata.get("source_name"),
                         context_chunk=context_chunk,
+                        content_token_count=int(token_counts.get(encoding_name, 0)),
                         document_id=metadata.get("document_id"),
                         title=metadata.get("title"),
                         uri=metadata.get("uri"),
@@ -0,0 +1,295 @@
+import json
+import os
+from typing import Optional
+
+import numpy as np
+from services.database.ivf_index import assign_to_centroids, train_kmeans
+
+
+class VectorQuantizer:
+    """
+    Compressed codes for a vector store, scanned with asymmetric distance.
+    Queries stay full precision and are scored against the codes, so only the codes need to be
+    in memory. Callers re-rank the best candidates against the full precision vectors.
+    int8 keeps a byte per dimension (4x smaller). pq splits vectors into n_subvectors and keeps
+    a byte per subvector (1536 dims with 96 subvectors is 64x smaller).
+    Codes are stored row aligned with the vector store, like the IVF assignments.
+    """
+
+    QUANTIZER_FILE_NAME: str = "quantizer.npz"
+    CODES_FILE_NAME: str = "quantizer_codes.u8"
+    META_FILE_NAME: str = "quantizer_meta.json"
+    SUPPORTED_QUANTIZATION_TYPES: list[str] = ["none", "int8", "pq"]
+    PQ_N_CENTROIDS: int = 256
+    TRAINING_SAMPLE_SIZE: int = 65536
+    # Bounds the float32 scratch space used while scanning codes
+    SCAN_BATCH_SIZE: int = 16384
+
+    def __init__(
+        self,
+        index_dir: str,
+        quantization_type: str,
+        metric: str,
+        dimension: int,
+        n_subvectors: int = 96,
+    ):
+        if quantization_type not in self.SUPPORTED_QUANTIZATION_TYPES:
+            raise ValueError(
+                f"Quantization type {quantization_type} not in {self.SUPPORTED_QUANTIZATION_TYPES}"
+            )
+        # Checked here so a bad config fails before anything is written, not at training time
+        if quantization_type == "pq" and (n_subvectors < 1 or dimension % n_subvectors):
+            raise ValueError(
+                f"Dimension {dimension} is not divisible by n_subvectors {n_subvectors}"
+            )
+        self.index_dir = index_dir
+        self.quantization_type = quantization_type
+        self.metric = metric
+        self.n_subvectors = n_subvectors
+        self.codes = np.zeros((0, 0), dtype=np.uint8)
+        self.trained_size: int = 0
+        # int8
+        self.offsets: Optional[np.ndarray] = None
+        self.scales: Optional[np.ndarray] = None
+        self._code_norms: Optional[np.ndarray] = None
+        # pq
+        self.pq_centroids: Optional[np.ndarray] = None
+
+    @property
+    def quantizer_path(self) -> str:
+        return os.path.join(self.index_dir, self.QUANTIZER_FILE_NAME)
+
+    @property
+    def codes_path(self) -> str:
+        return os.path.join(self.index_dir, self.CODES_FILE_NAME)
+
+    @property
+    def meta_path(self) -> str:
+        return os.path.join(self.index_dir, self.META_FILE_NAME)
+
+    @property
+    def is_enabled(self) -> bool:
+        return self.quantization_type != "none"
+
+    @property
+    def is_trained(self) -> bool:
+        if self.quantization_type == "int8":
+            return self.scales is not None
+        if self.quantization_type == "pq":
+            return self.pq_centroids is not None
+        return False
+
+    @property
+    def code_size(self) -> int:
+        if self.quantization_type == "int8" and self.scales is not None:
+            return len(self.scales)
+        if self.quantization_type == "pq" and self.pq_centroids is not None:
+            return len(self.pq_centroids)
+        return 0
+
+    def load(self, row_count: int) -> bool:
+        if not self.is_enabled:
+            return False
+        if not os.path.exists(self.quantizer_path) or not os.path.exists(self.codes_path):
+            return False
+        with np.load(self.quantizer_path) as params:
+            if str(params["quantization_type"]) != self.quantization_type:
+                self.reset()
+                return False
+            if self.quantization_type == "int8":
+                self.offsets = params["offsets"]
+                self.scales = params["scales"]
+            else:
+                self.pq_centroids = params["pq_centroids"]
+        if os.path.getsize(self.codes_path) != row_count * self.code_size:
+            # Out of sync with the vector store. The caller retrains.
+            self.reset()
+            return False
+        self.codes = (
+            np.memmap(self.codes_path, dtype=np.uint8, mode="r", shape=(row_count, self.code_size))
+            if row_count
+            else np.zeros((0, self.code_size), dtype=np.uint8)
+        )
+        with open(self.meta_path, "r", encoding="utf-8") as file:
+            self.trained_size = json.load(file).get("trained_size", 0)
+        self._code_norms = None
+        return True
+
+    def train(
+        self, training_vectors: np.ndarray, vectors: np.ndarray, live_count: int, seed: int = 0
+    ):
+        """
+        Fits the quantizer on training_vectors and encodes every row of vectors.
+        live_count is the number of rows that aren't tombstoned, the size retraining is judged by.
+        """
+        rng = np.random.default_rng(seed)
+        if len(training_vectors) > self.TRAINING_SAMPLE_SIZE:
+            sample_rows = np.sort(
+                rng.choice(len(training_vectors), size=self.TRAINING_SAMPLE_SIZE, replace=False)
+            )
+            training_vectors = training_vectors[sample_rows]
+        training_vectors = np.asarray(training_vectors, dtype=np.float32)
+        if not len(training_vectors):
+            raise ValueError("Need vectors to train the quantizer.")
+
+        if self.quantization_type == "int8":
+            self.offsets = training_vectors.min(axis=0)
+            scales = (training_vectors.max(axis=0) - self.offsets) / 255
+            scales[scales == 0] = 1
+            self.scales = scales.astype(np.float32)
+        elif self.quantization_type == "pq":
+            dimension = training_vectors.shape[1]
+            if dimension % self.n_subvectors:
+                raise ValueError(
+                    f"Dimension {dimension} is not divisible by n_subvectors {self.n_subvectors}"
+                )
+            n_centroids = min(self.PQ_N_CENTROIDS, len(training_vectors))
+            self.pq_centroids = np.stack(
+                [
+                    train_kmeans(subvectors, n_clusters=n_centroids, seed=seed)
+                    for subvectors in self.split_subvectors(training_vectors)
+                ]
+            )
+        else:
+            raise ValueError("Quantization is disabled.")
+
+        self.codes = self.encode(vectors)
+        self.trained_size = live_count
+        self._code_norms = None
+        self.save()
+
+    def split_subvectors(self, vectors: np.ndarray) -> list[np.ndarray]:
+        return np.split(np.asarray(vectors, dtype=np.float32), self.n_subvectors, axis=1)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.empty((len(vectors), self.code_size), dtype=np.uint8)
+        for start in range(0, len(vectors), self.SCAN_BATCH_SIZE):
+            batch = np.asarray(vectors[start : start + self.SCAN_BATCH_SIZE], dtype=np.float32)
+            if self.quantization_type == "int8":
+                codes[start : start + len(batch)] = np.clip(
+                    np.rint((batch - self.offsets) / self.scales), 0, 255
+                )
+            elif self.pq_centroids is not None:
+                for i, subvectors in enumerate(self.split_subvectors(batch)):
+                    codes[start : start + len(batch), i] = assign_to_centroids(
+                        subvectors, self.pq_centroids[i]
+                    )
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        if self.quantization_type == "int8":
+            return codes.astype(np.float32) * self.scales + self.offsets
+        if self.pq_centroids is None:
+            raise ValueError("Quantizer must be trained before it can decode.")
+        return np.concatenate(
+            [self.pq_centroids[i][codes[:, i]] for i in range(self.code_size)], axis=1
+        )
+
+    def add(self, vectors: np.ndarray):
+        if not self.is_trained:
+            return
+        new_codes = self.encode(vectors)
+        with open(self.codes_path, "ab") as file:
+            file.write(new_codes.tobytes())
+        self.codes = np.concatenate([self.codes, new_codes])
+        self._code_norms = None
+
+    def compact(self, keep_rows: np.ndarray):
+        if not self.is_trained:
+            return
+        self.codes = np.ascontiguousarray(self.codes[keep_rows])
+        self._code_norms = None
+        self.save()
+
+    def save(self):
+        if not self.is_trained:
+            return
+        os.makedirs(self.index_dir, exist_ok=True)
+        tmp_quantizer_path = f"{self.quantizer_path}.tmp.npz"
+        tmp_codes_path = f"{self.codes_path}.tmp"
+        if self.quantization_type == "int8":
+            np.savez(
+                tmp_quantizer_path,
+                quantization_type=self.quantization_type,
+                offsets=self.offsets,
+                scales=self.scales,
+            )
+        else:
+            np.savez(
+                tmp_quantizer_path,
+                quantization_type=self.quantization_type,
+                pq_centroids=self.pq_centroids,
+            )
+        with open(tmp_codes_path, "wb") as file:
+            file.write(np.ascontiguousarray(self.codes, dtype=np.uint8).tobytes())
+        with open(self.meta_path, "w", encoding="utf-8") as file:
+            json.dump({"trained_size": self.trained_size}, file)
+        os.replace(tmp_quantizer_path, self.quantizer_path)
+        os.replace(tmp_codes_path, self.codes_path)
+
+    def reset(self):
+        for path in [self.quantizer_path, self.codes_path, self.meta_path]:
+            if os.path.exists(path):
+                os.remove(path)
+        self.codes = np.zeros((0, 0), dtype=np.uint8)
+        self.trained_size = 0
+        self.offsets = None
+        self.scales = None
+        self.pq_centroids = None
+        self._code_norms = None
+
+    def get_code_norms(self) -> np.ndarray:
+        """Squared norms of the decoded int8 vectors, used for euclidean scores."""
+        if self._code_norms is None:
+            norms = np.empty(len(self.codes), dtype=np.float32)
+            for start in range(0, len(self.codes), self.SCAN_BATCH_SIZE):
+                decoded = self.decode(self.codes[start : start + self.SCAN_BATCH_SIZE])
+                norms[start : start + len(decoded)] = np.sum(decoded**2, axis=1)
+            self._code_norms = norms
+        return self._code_norms
+
+    def score(self, queries: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Approximate scores of each query against each row, higher is better.
+        Returns a (n_queries, n_rows) matrix, over every row when rows is None.
+        """
+        if not self.is_trained:
+            raise ValueError("Quantizer must be trained before it can be searched.")
+        row_count = len(self.codes) if rows is None else len(rows)
+        scores = np.empty((len(queries), row_count), dtype=np.float32)
+        if self.quantization_type == "int8":
+            # q.(codes * scales + offsets) == (q * scales).codes + q.offsets
+            scaled_queries = queries * self.scales
+            query_offsets = queries @ self.offsets
+            for start in range(0, row_count, self.SCAN_BATCH_SIZE):
+                batch_rows = slice(start, start + self.SCAN_BATCH_SIZE)
+                codes = self.codes[batch_rows] if rows is None else self.codes[rows[batch_rows]]
+                batch_scores = scaled_queries @ codes.T.astype(np.float32) + query_offsets[:, None]
+                if self.metric == "euclidean":
+                    norms = self.get_code_norms()
+                    batch_norms = norms[batch_rows] if rows is None else norms[rows[batch_rows]]
+                    batch_scores = -(
+                        np.sum(queries**2, axis=1, keepdims=True) - 2 * batch_scores + batch_norms
+                    )
+                scores[:, start : start + len(codes)] = batch_scores
+            return scores
+
+        if self.pq_centroids is None:
+            raise ValueError("Quantizer must be trained before it can be searched.")
+        # One lookup table per query of each subvector's score against every centroid
+        query_subvectors = np.stack(self.split_subvectors(queries), axis=1)
+        if self.metric == "euclidean":
+            lookup_tables = -np.sum(
+                (query_subvectors[:, :, None, :] - self.pq_centroids[None]) ** 2, axis=3
+            )
+        else:
+            lookup_tables = np.einsum("qmd,mkd->qmk", query_subvectors, self.pq_centroids)
+        for start in range(0, row_count, self.SCAN_BATCH_SIZE):
+            batch_rows = slice(start, start + self.SCAN_BATCH_SIZE)
+            codes = self.codes[batch_rows] if rows is None else self.codes[rows[batch_rows]]
+            batch_scores = scores[:, start : start + len(codes)]
+            batch_scores[:] = 0
+            # One gather per subvector covers every query at once
+            for i in range(self.code_size):
+                batch_scores += lookup_tables[:, i, codes[:, i]]
+        return scores
@@ -1,12 +1,15 @@
 from typing import Literal
 
+from services.embedding.embedding_hashing import HashingEmbedding
 from services.embedding.embedding_openai import OpenAIEmbedding
 
-AVAILABLE_PROVIDERS_TYPINGS = Literal[OpenAIEmbedding.class_name]
-AVAILABLE_PROVIDERS_NAMES: list[str] = [OpenAIEmbedding.CLASS_NAME]
+AVAILABLE_PROVIDERS_TYPINGS = Literal[OpenAIEmbedding.class_name, HashingEmbedding.class_name]
+AVAILABLE_PROVIDERS_NAMES: list[str] = [OpenAIEmbedding.CLASS_NAME, HashingEmbedding.CLASS_NAME]
 AVAILABLE_PROVIDERS = [
     OpenAIEmbedding,
+    HashingEmbedding,
 ]
 AVAILABLE_PROVIDERS_UI_NAMES = [
     OpenAIEmbedding.CLASS_UI_NAME,
+    HashingEmbedding.CLASS_UI_NAME,
 ]
@@ -1,7 +1,10 @@
+import asyncio
 import typing
 from abc import ABC, abstractmethod
-from typing import Any, Final, Iterator, Literal, Optional, Type, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Final, Iterator, Literal, Optional, Type, Union
 
+import services.text_processing.text_utils as text_utils
 from pydantic import BaseModel
 from services.service_base import ServiceBase
 
@@ -38,3 +41,94 @@ class EmbeddingBase(ABC, ServiceBase):
         self, texts: list[str]
     ) -> list[list[float]]:
         raise NotImplementedError
+
+    async def aget_embedding_of_text_with_provider(self, text: str) -> list[float]:
+        # Providers without an async client fall back to a worker thread
+        return await asyncio.to_thread(self.get_embedding_of_text_with_provider, text)
+
+    async def aget_embeddings_from_list_of_texts_with_provider(
+        self, texts: list[str]
+    ) -> list[list[float]]:
+        return await asyncio.to_thread(self.get_embeddings_from_list_of_texts_with_provider, texts)
+
+    def split_texts_into_batches(
+        self, texts: list[str], max_batch_tokens: int, max_batch_size: int
+    ) -> list[list[int]]:
+        """Packs text indexes into batches under the token and item limits, keeping order."""
+        batches: list[list[int]] = []
+        current_batch: list[int] = []
+        current_tokens = 0
+        for i, text in enumerate(texts):
+            text_tokens = text_utils.tiktoken_len(text, self.embedding_model_instance.MODEL_NAME)
+            # A text over the limit goes alone and is left to the provider to handle
+            if current_batch and (
+                current_tokens + text_tokens > max_batch_tokens
+                or len(current_batch) >= max_batch_size
+            ):
+                batches.append(current_batch)
+                current_batch = []
+                current_tokens = 0
+            current_batch.append(i)
+            current_tokens += text_tokens
+        if current_batch:
+            batches.append(current_batch)
+        return batches
+
+    def embed_texts_in_batches(
+        self,
+        texts: list[str],
+        embed_batch: Callable[[list[str]], list[list[float]]],
+        max_batch_tokens: int,
+        max_batch_size: int,
+        max_concurrent_requests: int,
+    ) -> list[list[float]]:
+        """Embeds batches concurrently and reassembles the embeddings in the order of texts."""
+        batches = self.split_texts_into_batches(texts, max_batch_tokens, max_batch_size)
+        text_embeddings: list[Optional[list[float]]] = [None] * len(texts)
+
+        def embed_indexes(batch: list[int]) -> list[list[float]]:
+            batch_embeddings = embed_batch([texts[i] for i in batch])
+            if len(batch_embeddings) != len(batch):
+                raise ValueError(
+                    f"Expected {len(batch)} embeddings from batch but got {len(batch_embeddings)}"
+                )
+            return batch_embeddings
+
+        max_workers = max(1, min(max_concurrent_requests, len(batches)))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for batch, batch_embeddings in zip(batches, executor.map(embed_indexes, batches)):
+                for i, text_embedding in zip(batch, batch_embeddings):
+                    text_embeddings[i] = text_embedding
+
+        self.log.info(f"Embedded {len(texts)} texts in {len(batches)} batches")
+        return typing.cast(list[list[float]], text_embeddings)
+
+    async def aembed_texts_in_batches(
+        self,
+        texts: list[str],
+        aembed_batch: Callable[[list[str]], Awaitable[list[list[float]]]],
+        max_batch_tokens: int,
+        max_batch_size: int,
+        max_concurrent_requests: int,
+    ) -> list[list[float]]:
+        """Async version of embed_texts_in_batches."""
+        batches = self.split_texts_into_batches(texts, max_batch_tokens, max_batch_size)
+        text_embeddings: list[Optional[list[float]]] = [None] * len(texts)
+        semaphore = asyncio.Semaphore(max(1, max_concurrent_requests))
+
+        async def embed_indexes(batch: list[int]) -> list[list[float]]:
+            async with semaphore:
+                batch_embeddings = await aembed_batch([texts[i] for i in batch])
+            if len(batch_embeddings) != len(batch):
+                raise ValueError(
+                    f"Expected {len(batch)} embeddings from batch but got {len(batch_embeddings)}"
+                )
+            return batch_embeddings
+
+        all_batch_embeddings = await asyncio.gather(*(embed_indexes(batch) for batch in batches))
+        for batch, batch_embeddings in zip(batches, all_batch_embeddings):
+            for i, text_embedding in zip(batch, batch_embeddings):
+                text_embeddings[i] = text_embedding
+
+        self.log.info(f"Embedded {len(texts)} texts in {len(batches)} batches")
+        return typing.cast(list[list[float]], text_embeddings)
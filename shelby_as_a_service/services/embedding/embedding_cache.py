@@ -0,0 +1,142 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Content addressed embedding cache in its own SQLite file.
+    Keys are the sha256 of the model name and the sha256 of the text, so identical text is only
+    embedded once per model. Embeddings are stored as float32 blobs.
+    Least recently used entries are evicted once the cache grows past max_entries.
+    """
+
+    CACHE_FILE_NAME: str = "embedding_cache.db"
+    # Evict down to this fraction of max_entries so eviction doesn't run on every insert
+    EVICTION_TARGET_RATIO: float = 0.9
+    # SQLite's default limit on bound parameters is 999
+    QUERY_BATCH_SIZE: int = 500
+
+    def __init__(self, local_index_dir: str, max_entries: int = 50000):
+        os.makedirs(local_index_dir, exist_ok=True)
+        self.db_path = os.path.join(local_index_dir, self.CACHE_FILE_NAME)
+        self.max_entries = max_entries
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, embedding BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # A connection per call keeps the cache safe to share across threads
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    @staticmethod
+    def get_key(model_name: str, text_hash: str) -> str:
+        return hashlib.sha256(f"{model_name}:{text_hash}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model_name: str, text_hashes: list[str]) -> list[Optional[list[float]]]:
+        keys = [self.get_key(model_name, text_hash) for text_hash in text_hashes]
+        found: dict[str, list[float]] = {}
+        with self._connect() as connection:
+            for i in range(0, len(keys), self.QUERY_BATCH_SIZE):
+                batch = keys[i : i + self.QUERY_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                for key, blob in connection.execute(
+                    f"SELECT key, embedding FROM embeddings WHERE key IN ({placeholders})", batch
+                ):
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+            now = time.time()
+            connection.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(now, key) for key in found],
+            )
+        return [found.get(key) for key in keys]
+
+    def put_many(self, model_name: str, text_hashes: list[str], embeddings: list[list[float]]):
+        now = time.time()
+        with self._connect() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, embedding, last_used) VALUES (?, ?, ?)",
+                [
+                    (
+                        self.get_key(model_name, text_hash),
+                        np.asarray(embedding, dtype=np.float32).tobytes(),
+                        now,
+                    )
+                    for text_hash, embedding in zip(text_hashes, embeddings)
+                ],
+            )
+            self._evict(connection)
+
+    def _evict(self, connection: sqlite3.Connection):
+        (entry_count,) = connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        if entry_count <= self.max_entries:
+            return
+        evict_count = entry_count - int(self.max_entries * self.EVICTION_TARGET_RATIO)
+        connection.execute(
+            "DELETE FROM embeddings WHERE key IN "
+            "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+            (evict_count,),
+        )
+
+
+class QueryEmbeddingCache:
+    """
+    In memory LRU cache of query embeddings with a TTL, keyed by normalized query text.
+    Counts hits and misses so the hit rate can be checked from the logs.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries: OrderedDict[str, tuple[float, list[float]]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def normalize_query(text: str) -> str:
+        return " ".join(text.split()).casefold()
+
+    def get(self, text: str) -> Optional[list[float]]:
+        key = self.normalize_query(text)
+        with self.lock:
+            if (entry := self.entries.get(key)) is None or time.monotonic() > entry[0]:
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, text: str, embedding: list[float]):
+        key = self.normalize_query(text)
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl_seconds, embedding)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
@@ -0,0 +1,162 @@
+import hashlib
+import math
+import re
+import typing
+from collections import Counter
+from typing import Any, Literal, Optional
+
+import numpy as np
+from pydantic import BaseModel
+from services.embedding.embedding_base import EmbeddingBase
+
+
+class ClassConfigModel(BaseModel):
+    provider_model_name: str = "feature-hashing-random-projection"
+    embedding_dimension: int = 1536
+    # Each feature is projected onto this many signed dimensions
+    projection_density: int = 8
+    projection_seed: int = 0
+    include_bigrams: bool = True
+    # Hashing is cheaper than a cache lookup
+    embedding_cache_enabled: bool = False
+    embedding_cache_max_entries: int = 50000
+
+    class Config:
+        extra = "ignore"
+
+
+class HashingEmbedding(EmbeddingBase):
+    """
+    CPU only embedding with no network calls or fitted state.
+    Word unigrams and bigrams are weighted by sublinear term frequency, then projected with a
+    sparse random projection seeded from a keyed hash of each feature.
+    The same text always gets the same embedding, across processes and machines.
+    """
+
+    class_name = Literal["hashing_embedding"]
+    CLASS_NAME: str = typing.get_args(class_name)[0]
+    CLASS_UI_NAME: str = "Hashing Embedding (Offline)"
+    REQUIRED_SECRETS: list[str] = []
+
+    TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+    # blake2b digests are at most 64 bytes
+    MAX_PROJECTION_DENSITY: int = 12
+
+    class ModelConfig(BaseModel):
+        MODEL_NAME: str
+        TOKENS_MAX: int
+        COST_PER_K: float
+
+        class Config:
+            extra = "ignore"
+
+    MODEL_DEFINITIONS: dict[str, Any] = {
+        "feature-hashing-random-projection": {
+            "MODEL_NAME": "feature-hashing-random-projection",
+            "TOKENS_MAX": 8192,
+            "COST_PER_K": 0.0,
+        }
+    }
+
+    class_config_model = ClassConfigModel
+    config: ClassConfigModel
+
+    def __init__(
+        self,
+        provider_model_name: Optional[str] = None,
+        context_index_config: dict[str, Any] = {},
+        config_file_dict: dict[str, Any] = {},
+        **kwargs,
+    ):
+        if not provider_model_name:
+            provider_model_name = kwargs.pop("provider_model_name", None)
+        else:
+            kwargs.pop("provider_model_name", None)
+        if not provider_model_name:
+            provider_model_name = ClassConfigModel.model_fields["provider_model_name"].default
+        super().__init__(
+            provider_model_name=provider_model_name,
+            context_index_config=context_index_config,
+            config_file_dict=config_file_dict,
+            **kwargs,
+        )
+        if not self.current_provider_model_instance:
+            raise ValueError("current_provider_model_instance not properly set!")
+        if self.config.embedding_dimension < 1:
+            raise ValueError("embedding_dimension must be positive")
+        if not 1 <= self.config.projection_density <= self.MAX_PROJECTION_DENSITY:
+            raise ValueError(
+                f"projection_density must be between 1 and {self.MAX_PROJECTION_DENSITY}"
+            )
+        self.embedding_model_instance: "HashingEmbedding.ModelConfig" = (
+            self.current_provider_model_instance
+        )
+        self.hash_key = self.config.projection_seed.to_bytes(8, "little", signed=True)
+        self.projection_cache: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+
+    def get_feature_projection(self, feature: str) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the dimensions and signs a feature projects onto."""
+        if (projection := self.projection_cache.get(feature)) is not None:
+            return projection
+        density = self.config.projection_density
+        # 4 bytes pick each dimension and 1 byte its sign
+        digest = hashlib.blake2b(
+            feature.encode("utf-8"), digest_size=5 * density, key=self.hash_key
+        ).digest()
+        words = np.frombuffer(digest[: 4 * density], dtype="<u4")
+        signs = np.frombuffer(digest[4 * density : 5 * density], dtype=np.uint8)
+        projection = (
+            (words % self.config.embedding_dimension).astype(np.int64),
+            np.where(signs & 1, 1.0, -1.0),
+        )
+        # Bounded so a large corpus can't grow the cache without limit
+        if len(self.projection_cache) < 1_000_000:
+            self.projection_cache[feature] = projection
+        return projection
+
+    def get_features(self, text: str) -> Counter:
+        tokens = self.TOKEN_PATTERN.findall(text.lower())
+        features = Counter(tokens)
+        if self.config.include_bigrams:
+            features.update(f"{first} {second}" for first, second in zip(tokens, tokens[1:]))
+        return features
+
+    def embed_text(self, text: str) -> list[float]:
+        dimension = self.config.embedding_dimension
+        if not (features := self.get_features(text)):
+            return [0.0] * dimension
+        all_dimensions = []
+        all_weights = []
+        for feature, count in features.items():
+            dimensions, signs = self.get_feature_projection(feature)
+            all_dimensions.append(dimensions)
+            all_weights.append(signs * (1.0 + math.log(count)))
+        embedding = np.bincount(
+            np.concatenate(all_dimensions), weights=np.concatenate(all_weights), minlength=dimension
+        )
+        norm = np.linalg.norm(embedding)
+        if norm > 0:
+            embedding /= norm
+        return embedding.astype(np.float32).tolist()
+
+    def get_embedding_of_text_with_provider(
+        self,
+        text: str,
+    ) -> list[float]:
+        return self.embed_text(text)
+
+    def get_embeddings_from_list_of_texts_with_provider(
+        self,
+        texts: list[str],
+    ) -> list[list[float]]:
+        return [self.embed_text(text) for text in texts]
+
+    async def aget_embedding_of_text_with_provider(
+        self,
+        text: str,
+    ) -> list[float]:
+        # Fast enough that a worker thread would cost more than it saves
+        return self.embed_text(text)
+
+    def create_settings_ui(self):
+        pass
@@ -1,3 +1,4 @@
+import threading
 import typing
 from decimal import Decimal
 from typing import Any, Literal, Optional, Type
@@ -10,6 +11,13 @@ from services.embedding.embedding_base import EmbeddingBase
 
 class ClassConfigModel(BaseModel):
     provider_model_name: str = "text-embedding-ada-002"
+    embedding_cache_enabled: bool = True
+    embedding_cache_max_entries: int = 50000
+    query_embedding_cache_enabled: bool = True
+    query_embedding_cache_max_entries: int = 1024
+    query_embedding_cache_ttl_seconds: float = 3600
+    embedding_max_batch_size: int = 2048
+    embedding_max_concurrent_requests: int = 4
 
     class Config:
         extra = "ignore"
@@ -66,17 +74,27 @@ class OpenAIEmbedding(EmbeddingBase):
         self.embedding_model_instance: "OpenAIEmbedding.ModelConfig" = (
             self.current_provider_model_instance
         )
+        self.embedding_retriever: Optional[OpenAIEmbeddings] = None
+        self._embedding_retriever_lock = threading.Lock()
+
+    def get_embedding_retriever(self) -> OpenAIEmbeddings:
+        # One client per instance so the sync and async HTTP connection pools are reused
+        if self.embedding_retriever is None:
+            with self._embedding_retriever_lock:
+                if self.embedding_retriever is None:
+                    self.embedding_retriever = OpenAIEmbeddings(
+                        # Note that this is openai_api_key and not api_key
+                        api_key=self.secrets["openai_api_key"],
+                        model=self.embedding_model_instance.MODEL_NAME,
+                        request_timeout=self.OPENAI_TIMEOUT_SECONDS,  # type: ignore
+                    )
+        return self.embedding_retriever
 
     def get_embedding_of_text_with_provider(
         self,
         text: str,
     ) -> list[float]:
-        embedding_retriever = OpenAIEmbeddings(
-            # Note that this is openai_api_key and not api_key
-            api_key=self.secrets["openai_api_key"],
-            model=self.embedding_model_instance.MODEL_NAME,
-            request_timeout=self.OPENAI_TIMEOUT_SECONDS,  # type: ignore
-        )
+        embedding_retriever = self.get_embedding_retriever()
 
         text_embedding = embedding_retriever.embed_query(text)
 
@@ -88,18 +106,37 @@ class OpenAIEmbedding(EmbeddingBase):
         self,
         texts: list[str],
     ) -> list[list[float]]:
-        embedding_retriever = OpenAIEmbeddings(
-            # Note that this is openai_api_key and not api_key
-            api_key=self.secrets["openai_api_key"],
-            model=self.embedding_model_instance.MODEL_NAME,
-            request_timeout=self.OPENAI_TIMEOUT_SECONDS,  # type: ignore
+        embedding_retriever = self.get_embedding_retriever()
+
+        text_embeddings = self.embed_texts_in_batches(
+            texts=texts,
+            embed_batch=embedding_retriever.embed_documents,
+            max_batch_tokens=self.embedding_model_instance.TOKENS_MAX,
+            max_batch_size=self.config.embedding_max_batch_size,
+            max_concurrent_requests=self.config.embedding_max_concurrent_requests,
         )
-
-        text_embeddings = embedding_retriever.embed_documents(texts)
         # self._calculate_cost(query, model)
 
         return text_embeddings
 
+    async def aget_embedding_of_text_with_provider(
+        self,
+        text: str,
+    ) -> list[float]:
+        return await self.get_embedding_retriever().aembed_query(text)
+
+    async def aget_embeddings_from_list_of_texts_with_provider(
+        self,
+        texts: list[str],
+    ) -> list[list[float]]:
+        return await self.aembed_texts_in_batches(
+            texts=texts,
+            aembed_batch=self.get_embedding_retriever().aembed_documents,
+            max_batch_tokens=self.embedding_model_instance.TOKENS_MAX,
+            max_batch_size=self.config.embedding_max_batch_size,
+            max_concurrent_requests=self.config.embedding_max_concurrent_requests,
+        )
+
     def _calculate_cost(self, query, model):
         token_count = text_utils.tiktoken_len(query, model.MODEL_NAME)
 
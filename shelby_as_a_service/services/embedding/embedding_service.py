@@ -1,8 +1,11 @@
+import threading
 from typing import Any, Optional, Type
 
 import context_index.doc_index as doc_index_models
 import services.embedding as embedding
+import services.text_processing.text_utils as text_utils
 from services.embedding.embedding_base import EmbeddingBase
+from services.embedding.embedding_cache import EmbeddingCache, QueryEmbeddingCache
 
 
 class EmbeddingService(EmbeddingBase):
@@ -12,6 +15,10 @@ class EmbeddingService(EmbeddingBase):
     REQUIRED_CLASSES: list[Type] = embedding.AVAILABLE_PROVIDERS
     AVAILABLE_PROVIDERS_UI_NAMES: list[str] = embedding.AVAILABLE_PROVIDERS_UI_NAMES
     AVAILABLE_PROVIDERS_TYPINGS = embedding.AVAILABLE_PROVIDERS_TYPINGS
+    embedding_cache: Optional[EmbeddingCache] = None
+    # Shared by model so hot queries survive the service pool being invalidated
+    _query_embedding_caches: dict[str, QueryEmbeddingCache] = {}
+    _query_embedding_caches_lock = threading.Lock()
 
     def __init__(
         self,
@@ -46,26 +53,179 @@ class EmbeddingService(EmbeddingBase):
 
         self.embedding_provider: EmbeddingBase = self.current_provider_instance
 
+    @property
+    def cache_model_name(self) -> str:
+        provider = self.embedding_provider
+        return f"{provider.CLASS_NAME}:{provider.embedding_model_instance.MODEL_NAME}"
+
+    def get_embedding_cache(self) -> Optional[EmbeddingCache]:
+        provider_config = self.embedding_provider.config
+        if not getattr(provider_config, "embedding_cache_enabled", False):
+            return None
+        if self.embedding_cache is None:
+            self.embedding_cache = EmbeddingCache(
+                local_index_dir=self.local_index_dir,
+                max_entries=getattr(provider_config, "embedding_cache_max_entries", 50000),
+            )
+        return self.embedding_cache
+
+    def get_query_embedding_cache(self) -> Optional[QueryEmbeddingCache]:
+        provider_config = self.embedding_provider.config
+        if not getattr(provider_config, "query_embedding_cache_enabled", False):
+            return None
+        with EmbeddingService._query_embedding_caches_lock:
+            if (
+                query_cache := EmbeddingService._query_embedding_caches.get(self.cache_model_name)
+            ) is None:
+                query_cache = QueryEmbeddingCache(
+                    max_entries=getattr(provider_config, "query_embedding_cache_max_entries", 1024),
+                    ttl_seconds=getattr(provider_config, "query_embedding_cache_ttl_seconds", 3600),
+                )
+                EmbeddingService._query_embedding_caches[self.cache_model_name] = query_cache
+        return query_cache
+
+    def lookup_cached_embeddings(
+        self, texts: list[str], use_query_cache: bool = True
+    ) -> tuple[list[str], list[Optional[list[float]]], dict[str, str]]:
+        """Returns the text hashes, the cached embeddings and the texts that still need embedding."""
+        text_hashes = [text_utils.hash_content(text) for text in texts]
+        cached_embeddings: list[Optional[list[float]]] = [None] * len(texts)
+        query_cache = self.get_query_embedding_cache() if use_query_cache else None
+        if query_cache is not None:
+            cached_embeddings = [query_cache.get(text) for text in texts]
+        missing = [
+            i for i, text_embedding in enumerate(cached_embeddings) if text_embedding is None
+        ]
+        if missing and (embedding_cache := self.get_embedding_cache()) is not None:
+            found_embeddings = embedding_cache.get_many(
+                self.cache_model_name, [text_hashes[i] for i in missing]
+            )
+            for i, text_embedding in zip(missing, found_embeddings):
+                cached_embeddings[i] = text_embedding
+                if query_cache is not None and text_embedding is not None:
+                    query_cache.put(texts[i], text_embedding)
+        # Only misses go to the provider, and duplicate texts are only sent once
+        texts_to_embed = {
+            text_hash: text
+            for text_hash, text, text_embedding in zip(text_hashes, texts, cached_embeddings)
+            if text_embedding is None
+        }
+        return text_hashes, cached_embeddings, texts_to_embed
+
+    def merge_new_embeddings(
+        self,
+        text_hashes: list[str],
+        cached_embeddings: list[Optional[list[float]]],
+        texts_to_embed: dict[str, str],
+        text_embeddings: Optional[list[list[float]]],
+        use_query_cache: bool = True,
+    ) -> list[list[float]]:
+        if text_embeddings is None or len(text_embeddings) != len(texts_to_embed):
+            raise ValueError("No embeddings returned")
+        if texts_to_embed and (embedding_cache := self.get_embedding_cache()) is not None:
+            embedding_cache.put_many(
+                self.cache_model_name, list(texts_to_embed.keys()), text_embeddings
+            )
+        query_cache = self.get_query_embedding_cache() if use_query_cache else None
+        if query_cache is not None:
+            for text, text_embedding in zip(texts_to_embed.values(), text_embeddings):
+                query_cache.put(text, text_embedding)
+        new_embeddings = dict(zip(texts_to_embed.keys(), text_embeddings))
+
+        self.log.info(
+            f"Got {len(text_hashes)} embeddings. "
+            f"{len(text_hashes) - len(texts_to_embed)} from cache."
+        )
+        if query_cache is not None:
+            self.log.info(
+                f"Query embedding cache hits: {query_cache.hits} misses: {query_cache.misses}"
+            )
+        return [
+            text_embedding if text_embedding is not None else new_embeddings[text_hash]
+            for text_hash, text_embedding in zip(text_hashes, cached_embeddings)
+        ]
+
     def get_embedding_of_text(
         self,
         text: str,
     ) -> list[float]:
-        text_embedding = self.embedding_provider.get_embedding_of_text_with_provider(text=text)
-        if text_embedding is None:
-            raise ValueError("No embedding returned")
-        return text_embedding
+        text_hashes, cached_embeddings, texts_to_embed = self.lookup_cached_embeddings([text])
+        text_embeddings = []
+        if texts_to_embed:
+            text_embedding = self.embedding_provider.get_embedding_of_text_with_provider(text=text)
+            if text_embedding is None:
+                raise ValueError("No embedding returned")
+            text_embeddings = [text_embedding]
+        return self.merge_new_embeddings(
+            text_hashes, cached_embeddings, texts_to_embed, text_embeddings
+        )[0]
+
+    async def aget_embedding_of_text(
+        self,
+        text: str,
+    ) -> list[float]:
+        text_hashes, cached_embeddings, texts_to_embed = self.lookup_cached_embeddings([text])
+        text_embeddings = []
+        if texts_to_embed:
+            text_embedding = await self.embedding_provider.aget_embedding_of_text_with_provider(
+                text=text
+            )
+            if text_embedding is None:
+                raise ValueError("No embedding returned")
+            text_embeddings = [text_embedding]
+        return self.merge_new_embeddings(
+            text_hashes, cached_embeddings, texts_to_embed, text_embeddings
+        )[0]
 
     def get_embeddings_from_list_of_texts(
         self,
         texts: list[str],
+        use_query_cache: bool = True,
     ) -> list[list[float]]:
-        text_embeddings = self.embedding_provider.get_embeddings_from_list_of_texts_with_provider(
-            texts=texts
+        text_hashes, cached_embeddings, texts_to_embed = self.lookup_cached_embeddings(
+            texts, use_query_cache=use_query_cache
+        )
+        text_embeddings: Optional[list[list[float]]] = []
+        if texts_to_embed:
+            text_embeddings = (
+                self.embedding_provider.get_embeddings_from_list_of_texts_with_provider(
+                    texts=list(texts_to_embed.values())
+                )
+            )
+            if text_embeddings is None:
+                raise ValueError("No embeddings returned")
+        return self.merge_new_embeddings(
+            text_hashes,
+            cached_embeddings,
+            texts_to_embed,
+            text_embeddings,
+            use_query_cache=use_query_cache,
+        )
+
+    async def aget_embeddings_from_list_of_texts(
+        self,
+        texts: list[str],
+        use_query_cache: bool = True,
+    ) -> list[list[float]]:
+        text_hashes, cached_embeddings, texts_to_embed = self.lookup_cached_embeddings(
+            texts, use_query_cache=use_query_cache
+        )
+        text_embeddings: Optional[list[list[float]]] = []
+        if texts_to_embed:
+            text_embeddings = (
+                await self.embedding_provider.aget_embeddings_from_list_of_texts_with_provider(
+                    texts=list(texts_to_embed.values())
+                )
+            )
+            if text_embeddings is None:
+                raise ValueError("No embeddings returned")
+        return self.merge_new_embeddings(
+            text_hashes,
+            cached_embeddings,
+            texts_to_embed,
+            text_embeddings,
+            use_query_cache=use_query_cache,
         )
-        if text_embeddings is None:
-            raise ValueError("No embeddings returned")
-        self.log.info(f"Got {len(text_embeddings)} embeddings")
-        return text_embeddings
 
     def get_document_embeddings_for_chunks_to_upsert(
         self,
@@ -76,8 +236,10 @@ class EmbeddingService(EmbeddingBase):
         for chunk in chunks_to_upsert:
             upsert_chunks_text.append(chunk.context_chunk)
 
+        # Chunks would only push hot queries out of the query cache
         upsert_docs_text_embeddings = self.get_embeddings_from_list_of_texts(
             texts=upsert_chunks_text,
+            use_query_cache=False,
         )
         if len(upsert_docs_text_embeddings) != len(upsert_chunks_text):
             raise ValueError("Number of embeddings does not match number of context chunks")
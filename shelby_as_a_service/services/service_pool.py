@@ -0,0 +1,45 @@
+import hashlib
+import json
+import threading
+from typing import Any, Callable, TypeVar
+
+ServiceType = TypeVar("ServiceType")
+
+
+class ServicePool:
+    """
+    Process wide pool of service instances keyed by class, provider name and a hash of the config.
+    Pooled instances are shared across threads so they must not hold per request state.
+    Call invalidate() when the doc index config changes.
+    """
+
+    _instances: dict[str, Any] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def make_key(service_class: type, *key_parts: Any) -> str:
+        hashed_parts = hashlib.sha256(
+            json.dumps(key_parts, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+        return f"{service_class.__name__}:{hashed_parts}"
+
+    @classmethod
+    def get_or_create(
+        cls,
+        service_class: type[ServiceType],
+        factory: Callable[[], ServiceType],
+        *key_parts: Any,
+    ) -> ServiceType:
+        key = cls.make_key(service_class, *key_parts)
+        if (instance := cls._instances.get(key)) is not None:
+            return instance
+        # Built outside the lock since factories pool their own sub services.
+        # If two threads race the first one stored wins and the other instance is dropped.
+        instance = factory()
+        with cls._lock:
+            return cls._instances.setdefault(key, instance)
+
+    @classmethod
+    def invalidate(cls):
+        with cls._lock:
+            cls._instances.clear()
@@ -118,7 +118,7 @@ class IngestProcessingService(IngestProcessingBase):
         if not ingest_doc.existing_document_model:
             return []
         for chunk in ingest_doc.existing_document_model.context_chunks:
-            doc_db_ids.append(chunk.id)
+            doc_db_ids.append(chunk.chunk_doc_db_id)
             self.session.flush()
             self.session.delete(chunk)
             self.session.flush()
@@ -144,15 +144,20 @@ class IngestProcessingService(IngestProcessingBase):
             self.session.flush()
             source.documents.append(ingest_doc.existing_document_model)
             self.session.flush()
-        for chunk in text_chunks:
+        # Counted once here so retrieval never has to tokenize chunks
+        doc_token_count = [tiktoken_len(chunk) for chunk in text_chunks]
+        encoding_name = text_utils.get_encoding_name()
+        for chunk_index, (chunk, chunk_token_count) in enumerate(zip(text_chunks, doc_token_count)):
             ingest_doc.existing_document_model.context_chunks.append(
                 doc_index_models.ChunkModel(
-                    context_chunk=chunk, chunk_doc_db_name=source.enabled_doc_db.name
+                    context_chunk=chunk,
+                    chunk_index=chunk_index,
+                    chunk_doc_db_name=source.enabled_doc_db.name,
+                    token_counts={encoding_name: chunk_token_count},
                 )
             )
             self.successfully_chunked_counter += 1
             self.session.flush()
-        doc_token_count = [tiktoken_len(chunk) for chunk in text_chunks]
         self.docs_token_counts.extend(doc_token_count)
         self.log.info(
             f"🟢 Doc split into {len(text_chunks)} of averge length {int(sum(doc_token_count) / len(text_chunks))}"
@@ -1 +1,3 @@
-from pinecone_text.hybrid.hybrid_convex import hybrid_convex_scale
+from services.text_processing.pinecone_io_pinecone_text.hybrid.hybrid_convex import (
+    hybrid_convex_scale,
+)
@@ -1,6 +1,6 @@
 from typing import Tuple
 
-from pinecone_text.sparse import SparseVector
+from services.text_processing.pinecone_io_pinecone_text.sparse import SparseVector
 
 
 def hybrid_convex_scale(
@@ -22,7 +22,7 @@ This allows a semantic search to be performed on the sparse vectors. The SPLADE
 For more information, see the [SPLADE paper](https://arxiv.org/abs/2109.10086). The SPLADE encoder is currently only available for inference only.
 """
 
-from typing import Dict, Union, list
+from typing import Dict, Union
 
 SparseVector = Dict[str, Union[list[int], list[float]]]
 
@@ -1,7 +1,7 @@
 from abc import ABC, abstractmethod
 from typing import Union
 
-from services.pinecone_io_pinecone_text.sparse import SparseVector
+from services.text_processing.pinecone_io_pinecone_text.sparse import SparseVector
 
 
 class BaseSparseEncoder(ABC):
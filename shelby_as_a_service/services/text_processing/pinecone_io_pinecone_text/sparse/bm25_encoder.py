@@ -6,10 +6,11 @@ from typing import Dict, Optional, Tuple, Union
 
 import mmh3
 import numpy as np
-import wget
-from services.pinecone_io_pinecone_text.sparse import SparseVector
-from services.pinecone_io_pinecone_text.sparse.base_sparse_encoder import BaseSparseEncoder
-from services.pinecone_io_pinecone_text.sparse.bm25_tokenizer import BM25Tokenizer
+from services.text_processing.pinecone_io_pinecone_text.sparse import SparseVector
+from services.text_processing.pinecone_io_pinecone_text.sparse.base_sparse_encoder import (
+    BaseSparseEncoder,
+)
+from services.text_processing.pinecone_io_pinecone_text.sparse.bm25_tokenizer import BM25Tokenizer
 from tqdm.auto import tqdm
 
 
@@ -251,6 +252,8 @@ class BM25Encoder(BaseSparseEncoder):
     @staticmethod
     def default() -> "BM25Encoder":
         """Create a BM25 model from pre-made params for the MS MARCO passages corpus"""
+        import wget
+
         bm25 = BM25Encoder()
         url = "https://storage.googleapis.com/pinecone-datasets-dev/bm25_params/msmarco_bm25_params_v4_0_0.json"
         with tempfile.TemporaryDirectory() as tmp_dir:
@@ -1,5 +1,4 @@
 import string
-from typing import list
 
 import nltk
 from nltk import SnowballStemmer, word_tokenize
@@ -1,5 +1,6 @@
-from typing import Any
+from typing import Any, Optional
 
+import numpy as np
 import services.text_processing.text_utils as text_utils
 from context_index.doc_index.docs.context_docs import RetrievalDoc
 
@@ -13,17 +14,219 @@ def preprocess_retrieved_docs(
         return []
     preproc_docs = []
     for doc in retrieved_documents:
-        token_count = text_utils.tiktoken_len(doc.context_chunk)
-        doc.content_token_count = token_count
+        # Counted at ingest. Chunks ingested before token counts were stored are counted here.
+        if not (token_count := doc.content_token_count):
+            token_count = text_utils.tiktoken_len(doc.context_chunk)
+            doc.content_token_count = token_count
         if token_count < doc_max_tokens and token_count < max_total_tokens:
             preproc_docs.append(doc)
     return preproc_docs
 
 
+# Shorter shared text between neighbouring chunks isn't treated as splitter overlap
+MIN_CHUNK_OVERLAP_CHARS: int = 20
+
+
+def merge_overlapping_text(left: str, right: str) -> str:
+    """Joins neighbouring chunks, dropping the longest suffix of left that right starts with."""
+    probe = right[:MIN_CHUNK_OVERLAP_CHARS]
+    if len(probe) == MIN_CHUNK_OVERLAP_CHARS:
+        position = left.find(probe, max(0, len(left) - len(right)))
+        while position != -1:
+            if right.startswith(left[position:]):
+                return left + right[len(left) - position :]
+            position = left.find(probe, position + 1)
+    return f"{left}\n{right}"
+
+
+def expand_docs_with_neighbours(
+    retrieved_documents: list[RetrievalDoc],
+    neighbours: dict[str, list[tuple[int, str, Optional[str]]]],
+    token_limit: float,
+) -> list[RetrievalDoc]:
+    """
+    Grows each doc with its adjacent chunks, nearest first, while it stays under token_limit.
+    neighbours are from context_docs.load_neighbour_chunks. Higher scoring docs expand first and
+    a doc already included in another's expansion is dropped.
+    """
+    expanded_docs: dict[int, RetrievalDoc] = {}
+    covered_chunk_ids: set[str] = set()
+    by_score = sorted(
+        range(len(retrieved_documents)),
+        key=lambda i: retrieved_documents[i].score,
+        reverse=True,
+    )
+    for i in by_score:
+        doc = retrieved_documents[i]
+        if doc.chunk_doc_db_id in covered_chunk_ids:
+            continue
+        chunks = neighbours.get(doc.chunk_doc_db_id or "", [])
+        position = next(
+            (j for j, chunk in enumerate(chunks) if chunk[2] == doc.chunk_doc_db_id), None
+        )
+        if position is None:
+            expanded_docs[i] = doc
+            if doc.chunk_doc_db_id:
+                covered_chunk_ids.add(doc.chunk_doc_db_id)
+            continue
+
+        text = doc.context_chunk
+        token_count = doc.content_token_count
+        start = end = position
+        can_grow_forward = can_grow_backward = True
+        while can_grow_forward or can_grow_backward:
+            if can_grow_forward:
+                can_grow_forward = False
+                if (
+                    end + 1 < len(chunks)
+                    and chunks[end + 1][0] == chunks[end][0] + 1
+                    and chunks[end + 1][2] not in covered_chunk_ids
+                ):
+                    candidate = merge_overlapping_text(text, chunks[end + 1][1])
+                    if (candidate_count := text_utils.tiktoken_len(candidate)) < token_limit:
+                        text, token_count, end = candidate, candidate_count, end + 1
+                        can_grow_forward = True
+            if can_grow_backward:
+                can_grow_backward = False
+                if (
+                    start > 0
+                    and chunks[start - 1][0] == chunks[start][0] - 1
+                    and chunks[start - 1][2] not in covered_chunk_ids
+                ):
+                    candidate = merge_overlapping_text(chunks[start - 1][1], text)
+                    if (candidate_count := text_utils.tiktoken_len(candidate)) < token_limit:
+                        text, token_count, start = candidate, candidate_count, start - 1
+                        can_grow_backward = True
+
+        covered_chunk_ids.update(chunk[2] for chunk in chunks[start : end + 1] if chunk[2])
+        expanded_docs[i] = (
+            doc
+            if start == end
+            else doc.model_copy(update={"context_chunk": text, "content_token_count": token_count})
+        )
+    return [expanded_docs[i] for i in sorted(expanded_docs)]
+
+
+CONTEXT_PACKING_STRATEGIES: list[str] = ["legacy", "greedy", "knapsack"]
+# Above this many DP cells the knapsack packer falls back to greedy
+KNAPSACK_MAX_CELLS: int = 5_000_000
+
+
+def get_packing_values(docs: list[RetrievalDoc]) -> list[float]:
+    """Scores shifted to be positive so every doc is worth packing. Rank order is kept."""
+    scores = [doc.score for doc in docs]
+    if (min_score := min(scores)) > 0:
+        return scores
+    offset = 1e-6 - min_score
+    if all(score == 0 for score in scores):
+        # No scores so earlier docs are worth more, like the legacy packer's order
+        return [float(len(docs) - i) for i in range(len(docs))]
+    return [score + offset for score in scores]
+
+
+def rank_packed_docs(
+    packed_docs: list[RetrievalDoc], keep_order: bool = False
+) -> list[RetrievalDoc]:
+    if not keep_order and not all(doc.score == 0 for doc in packed_docs):
+        packed_docs = sorted(packed_docs, key=lambda doc: doc.score, reverse=True)
+    for i, doc in enumerate(packed_docs, start=1):
+        doc.retrieval_rank = i
+    return packed_docs
+
+
+def pack_docs_greedy(
+    retrieved_documents: list[RetrievalDoc],
+    max_total_tokens: float = 0,
+    docs_max_count: float = 0,
+    keep_order: bool = False,
+) -> list[RetrievalDoc]:
+    """
+    Packs docs by value per token, O(n log n).
+    Returns the better of the greedy pack and the single most valuable doc that fits,
+    which is at least half the value of the optimal pack when docs_max_count doesn't bind.
+    """
+    if not retrieved_documents:
+        return []
+    values = get_packing_values(retrieved_documents)
+    token_budget = max_total_tokens if max_total_tokens > 0 else float("inf")
+    count_budget = int(docs_max_count) if docs_max_count > 0 else len(retrieved_documents)
+    fitting = [
+        i for i, doc in enumerate(retrieved_documents) if doc.content_token_count <= token_budget
+    ]
+    if not fitting:
+        return []
+    order = sorted(
+        fitting,
+        key=lambda i: values[i] / max(retrieved_documents[i].content_token_count, 1),
+        reverse=True,
+    )
+    packed: list[int] = []
+    packed_tokens = 0
+    for i in order:
+        if len(packed) >= count_budget:
+            break
+        if packed_tokens + retrieved_documents[i].content_token_count <= token_budget:
+            packed.append(i)
+            packed_tokens += retrieved_documents[i].content_token_count
+    best_single = max(fitting, key=lambda i: values[i])
+    if values[best_single] > sum(values[i] for i in packed):
+        packed = [best_single]
+    if keep_order:
+        packed.sort()
+    return rank_packed_docs([retrieved_documents[i] for i in packed], keep_order=keep_order)
+
+
+def pack_docs_knapsack(
+    retrieved_documents: list[RetrievalDoc],
+    max_total_tokens: float = 0,
+    docs_max_count: float = 0,
+    keep_order: bool = False,
+) -> list[RetrievalDoc]:
+    """
+    Optimal pack of the most total score under the token and doc count budgets, as a 0/1 knapsack.
+    The DP is O(n * max_total_tokens * docs_max_count), vectorized over the budgets.
+    """
+    if not retrieved_documents:
+        return []
+    if max_total_tokens <= 0:
+        return pack_docs_greedy(retrieved_documents, max_total_tokens, docs_max_count, keep_order)
+    token_budget = int(max_total_tokens)
+    count_budget = int(docs_max_count) if docs_max_count > 0 else len(retrieved_documents)
+    count_budget = min(count_budget, len(retrieved_documents))
+    if len(retrieved_documents) * (count_budget + 1) * (token_budget + 1) > KNAPSACK_MAX_CELLS:
+        return pack_docs_greedy(retrieved_documents, max_total_tokens, docs_max_count, keep_order)
+
+    values = get_packing_values(retrieved_documents)
+    # best[k, w] is the best value of at most k docs in at most w tokens
+    best = np.zeros((count_budget + 1, token_budget + 1))
+    taken = np.zeros((len(retrieved_documents), count_budget + 1, token_budget + 1), dtype=bool)
+    for i, doc in enumerate(retrieved_documents):
+        tokens = doc.content_token_count
+        if tokens > token_budget:
+            continue
+        with_doc = np.full_like(best, -np.inf)
+        with_doc[1:, tokens:] = best[:-1, : token_budget + 1 - tokens] + values[i]
+        taken[i] = with_doc > best
+        best = np.maximum(best, with_doc)
+
+    packed: list[int] = []
+    k, w = count_budget, token_budget
+    for i in reversed(range(len(retrieved_documents))):
+        if taken[i, k, w]:
+            packed.append(i)
+            k -= 1
+            w -= retrieved_documents[i].content_token_count
+    return rank_packed_docs(
+        [retrieved_documents[i] for i in reversed(packed)], keep_order=keep_order
+    )
+
+
 def process_retrieved_docs(
     retrieved_documents: list[RetrievalDoc],
     max_total_tokens: float = 0,
     docs_max_count: float = 0,
+    packing_strategy: str = "legacy",
+    keep_order: bool = False,
 ) -> list[RetrievalDoc]:
     """
     Parses a list of retrieved documents, filtering them based on their token count and/or total token count,
@@ -36,6 +239,10 @@ def process_retrieved_docs(
             more tokens will be filtered out. Defaults to 0, which means no filtering based on token count.
         max_total_tokens (int, optional): The maximum total number of tokens allowed for all documents. Documents
             that exceed this limit will be filtered out. Defaults to 0, which means no filtering based on total token count.
+        packing_strategy (str, optional): "legacy" drops the longest docs until the budget fits. "greedy" packs by
+            score per token and "knapsack" packs the most total score exactly. Defaults to "legacy".
+        keep_order (bool, optional): Keep the input order instead of sorting by score, for docs already
+            ordered by MMR. Defaults to False.
 
 
     Returns:
@@ -43,6 +250,12 @@ def process_retrieved_docs(
     """
     if len(retrieved_documents) < 1:
         return []
+    if packing_strategy == "greedy":
+        return pack_docs_greedy(retrieved_documents, max_total_tokens, docs_max_count, keep_order)
+    if packing_strategy == "knapsack":
+        return pack_docs_knapsack(retrieved_documents, max_total_tokens, docs_max_count, keep_order)
+    if packing_strategy != "legacy":
+        raise ValueError(f"Packing strategy {packing_strategy} not in {CONTEXT_PACKING_STRATEGIES}")
 
     docs_total_tokens = 0
     for doc in retrieved_documents:
@@ -52,7 +265,7 @@ def process_retrieved_docs(
         retrieved_documents[0].retrieval_rank = 1
         return retrieved_documents
 
-    if all(doc.score == 0 for doc in retrieved_documents):
+    if keep_order or all(doc.score == 0 for doc in retrieved_documents):
         sorted_docs = retrieved_documents
     else:
         sorted_docs: list[RetrievalDoc] = sorted(
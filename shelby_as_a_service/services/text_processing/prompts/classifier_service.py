@@ -51,6 +51,60 @@ def boolean_classifier_response_parser(response: str) -> bool:
     return False
 
 
+# Multi Boolean Classifier
+def create_multi_boolean_classifier_logit_bias(
+    number_of_features: int,
+    llm_model_name: str,
+    separator: Literal["\n", ",", " "] = "\n",
+) -> tuple[dict[str, int], int]:
+    # Options 0 and 1, once per feature
+    return create_logit_bias(
+        number_of_options=1,
+        number_of_decisions=number_of_features,
+        llm_model_name=llm_model_name,
+        separator=separator,
+    )
+
+
+def create_multi_boolean_classifier_prompt(
+    features: list[str],
+    user_input: Optional[str] = None,
+    prompt_string: Optional[str] = None,
+    prompt_template_path: Optional[str] = None,
+    separator: Literal["\n", ",", " "] = "\n",
+) -> tuple[str, str]:
+    system_prompt = prompts.load_prompt_template(
+        prompt_template_path=prompt_template_path, prompt_string=prompt_string
+    )
+
+    system_prompt_string = (
+        system_prompt
+        + f"\nAnswer for each of the {len(features)} numbered features, in order."
+        + f"\nFor each feature, if true return 1, if false return 0. Separate the answers with {repr(separator)}."
+    )
+    user_input_string = "\n".join(
+        f"feature [{i}]: {feature}" for i, feature in enumerate(features, start=1)
+    )
+    if user_input:
+        user_input_string += f"\nuser_input: {user_input}"
+    return system_prompt_string, user_input_string
+
+
+def multi_boolean_classifier_response_parser(
+    response: str,
+    number_of_features: int,
+    separator: Literal["\n", ",", " "] = "\n",
+) -> list[bool]:
+    answers = [answer.strip() for answer in response.strip().split(separator)]
+    if len(answers) != number_of_features:
+        raise ValueError(
+            f"response '{response}' should have {number_of_features} answers, found {len(answers)}."
+        )
+    for answer in answers:
+        boolean_classifier_validator(response=answer)
+    return [boolean_classifier_response_parser(response=answer) for answer in answers]
+
+
 # Single Option Classifier
 def create_logit_bias(
     number_of_options: int,
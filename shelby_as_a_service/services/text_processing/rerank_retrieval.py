@@ -0,0 +1,243 @@
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Optional
+
+import numpy as np
+from context_index.doc_index.docs.context_docs import RetrievalDoc
+from services.text_processing.pinecone_io_pinecone_text.sparse.bm25_tokenizer import BM25Tokenizer
+
+RERANK_STRATEGIES: list[str] = ["none", "bm25", "cosine", "hybrid"]
+BM25_K1: float = 1.2
+BM25_B: float = 0.75
+
+
+class RerankMemo:
+    """
+    LRU memo of per chunk rerank stats keyed by (query hash, chunk_doc_db_id).
+    BM25 depends on the whole candidate set, so the memo holds each chunk's query term counts
+    and the set's scores are recomputed from them.
+    """
+
+    def __init__(self, max_entries: int = 20000):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[tuple[str, str], Any] = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def hash_query(query: str) -> str:
+        return hashlib.sha256(" ".join(query.split()).casefold().encode("utf-8")).hexdigest()
+
+    def get(self, query_hash: str, chunk_doc_db_id: Optional[str]) -> Optional[Any]:
+        if not chunk_doc_db_id:
+            return None
+        with self.lock:
+            if (entry := self.entries.get((query_hash, chunk_doc_db_id))) is not None:
+                self.entries.move_to_end((query_hash, chunk_doc_db_id))
+            return entry
+
+    def put(self, query_hash: str, chunk_doc_db_id: Optional[str], entry: Any):
+        if not chunk_doc_db_id:
+            return
+        with self.lock:
+            self.entries[(query_hash, chunk_doc_db_id)] = entry
+            self.entries.move_to_end((query_hash, chunk_doc_db_id))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+bm25_memo = RerankMemo()
+cosine_memo = RerankMemo()
+_bm25_tokenizer: Optional[BM25Tokenizer] = None
+_bm25_tokenizer_lock = threading.Lock()
+
+
+def get_bm25_tokenizer() -> BM25Tokenizer:
+    global _bm25_tokenizer
+    with _bm25_tokenizer_lock:
+        if _bm25_tokenizer is None:
+            # Same settings as BM25Encoder so scores match the sparse index
+            _bm25_tokenizer = BM25Tokenizer(
+                lower_case=True,
+                remove_punctuation=True,
+                remove_stopwords=True,
+                stem=True,
+                language="english",
+            )
+        return _bm25_tokenizer
+
+
+def score_bm25(query: str, docs: list[RetrievalDoc]) -> np.ndarray:
+    """Okapi BM25 of each doc against the query, with IDF taken over the candidate set."""
+    tokenizer = get_bm25_tokenizer()
+    query_term_counts = Counter(tokenizer(query))
+    if not query_term_counts or not docs:
+        return np.zeros(len(docs), dtype=np.float32)
+    query_terms = list(query_term_counts)
+    query_hash = RerankMemo.hash_query(query)
+
+    term_counts = np.empty((len(docs), len(query_terms)), dtype=np.float32)
+    doc_lengths = np.empty(len(docs), dtype=np.float32)
+    for i, doc in enumerate(docs):
+        if (stats := bm25_memo.get(query_hash, doc.chunk_doc_db_id)) is None:
+            doc_tokens = tokenizer(doc.context_chunk)
+            doc_term_counts = Counter(doc_tokens)
+            stats = (
+                np.array([doc_term_counts[term] for term in query_terms], dtype=np.float32),
+                len(doc_tokens),
+            )
+            bm25_memo.put(query_hash, doc.chunk_doc_db_id, stats)
+        term_counts[i], doc_lengths[i] = stats
+
+    document_frequencies = np.count_nonzero(term_counts, axis=0)
+    idf = np.log1p((len(docs) - document_frequencies + 0.5) / (document_frequencies + 0.5))
+    average_length = doc_lengths.mean() or 1.0
+    length_norms = BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths / average_length)
+    term_scores = term_counts * (BM25_K1 + 1) / (term_counts + length_norms[:, None])
+    query_weights = np.array([query_term_counts[term] for term in query_terms], dtype=np.float32)
+    return term_scores @ (idf * query_weights)
+
+
+def score_cosine(
+    query: str,
+    docs: list[RetrievalDoc],
+    get_cosine_similarities: Callable[[list[RetrievalDoc]], list[Optional[float]]],
+) -> np.ndarray:
+    """Exact cosine similarities, falling back to the doc_db's score where there is no embedding."""
+    query_hash = RerankMemo.hash_query(query)
+    similarities: list[Optional[float]] = [
+        cosine_memo.get(query_hash, doc.chunk_doc_db_id) for doc in docs
+    ]
+    missing = [i for i, similarity in enumerate(similarities) if similarity is None]
+    if missing:
+        for i, similarity in zip(missing, get_cosine_similarities([docs[i] for i in missing])):
+            if similarity is not None:
+                similarities[i] = similarity
+                cosine_memo.put(query_hash, docs[i].chunk_doc_db_id, similarity)
+    return np.array(
+        [
+            doc.score if similarity is None else similarity
+            for doc, similarity in zip(docs, similarities)
+        ],
+        dtype=np.float32,
+    )
+
+
+def min_max_normalize(scores: np.ndarray) -> np.ndarray:
+    if not len(scores) or (spread := scores.max() - scores.min()) == 0:
+        return np.zeros_like(scores)
+    return (scores - scores.min()) / spread
+
+
+def rerank_retrieved_docs(
+    query: str,
+    retrieved_documents: list[RetrievalDoc],
+    top_n: int,
+    strategy: str = "hybrid",
+    bm25_weight: float = 0.3,
+    get_cosine_similarities: Optional[Callable[[list[RetrievalDoc]], list[Optional[float]]]] = None,
+) -> list[RetrievalDoc]:
+    """
+    Re-scores over-fetched docs on the CPU and returns the top_n by the new score.
+    hybrid blends min-max normalized cosine and BM25 scores by bm25_weight.
+    """
+    if strategy not in RERANK_STRATEGIES:
+        raise ValueError(f"Rerank strategy {strategy} not in {RERANK_STRATEGIES}")
+    if strategy == "none" or not retrieved_documents:
+        return retrieved_documents[:top_n]
+    if strategy != "bm25" and get_cosine_similarities is None:
+        raise ValueError(f"Rerank strategy {strategy} needs get_cosine_similarities.")
+
+    if strategy == "bm25":
+        scores = score_bm25(query, retrieved_documents)
+    elif strategy == "cosine":
+        scores = score_cosine(query, retrieved_documents, get_cosine_similarities)  # type: ignore
+    else:
+        scores = (1 - bm25_weight) * min_max_normalize(
+            score_cosine(query, retrieved_documents, get_cosine_similarities)  # type: ignore
+        ) + bm25_weight * min_max_normalize(score_bm25(query, retrieved_documents))
+
+    for doc, score in zip(retrieved_documents, scores):
+        doc.score = float(score)
+    # Stable so ties keep the doc_db's order
+    order = np.argsort(-scores, kind="stable")[:top_n]
+    return [retrieved_documents[i] for i in order]
+
+
+SIMHASH_SHINGLE_SIZE: int = 3
+
+
+def get_chunk_simhash(text: str) -> int:
+    """64 bit simhash over word shingles. Near identical chunks differ in only a few bits."""
+    words = " ".join(text.split()).casefold().split(" ")
+    shingles = {
+        " ".join(words[i : i + SIMHASH_SHINGLE_SIZE])
+        for i in range(max(1, len(words) - SIMHASH_SHINGLE_SIZE + 1))
+    }
+    shingle_hashes = np.frombuffer(
+        b"".join(
+            hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest() for shingle in shingles
+        ),
+        dtype=np.uint8,
+    ).reshape(len(shingles), 8)
+    # Each bit is set when most shingles set it
+    bit_votes = np.unpackbits(shingle_hashes, axis=1).sum(axis=0, dtype=np.int64)
+    return int.from_bytes(np.packbits(bit_votes * 2 > len(shingles)).tobytes(), "big")
+
+
+def drop_duplicate_docs(
+    retrieved_documents: list[RetrievalDoc], near_duplicate_max_distance: int = 9
+) -> list[RetrievalDoc]:
+    """
+    Drops exact duplicates by content hash and near duplicates by simhash hamming distance.
+    The highest scoring copy is kept and the input order is otherwise unchanged.
+    """
+    kept: list[int] = []
+    kept_hashes: set[str] = set()
+    kept_simhashes: list[int] = []
+    by_score = sorted(
+        range(len(retrieved_documents)),
+        key=lambda i: retrieved_documents[i].score,
+        reverse=True,
+    )
+    for i in by_score:
+        text = " ".join(retrieved_documents[i].context_chunk.split())
+        if (content_hash := hashlib.sha256(text.encode("utf-8")).hexdigest()) in kept_hashes:
+            continue
+        simhash = get_chunk_simhash(text)
+        if any(
+            (simhash ^ kept_simhash).bit_count() <= near_duplicate_max_distance
+            for kept_simhash in kept_simhashes
+        ):
+            continue
+        kept.append(i)
+        kept_hashes.add(content_hash)
+        kept_simhashes.append(simhash)
+    return [retrieved_documents[i] for i in sorted(kept)]
+
+
+def select_docs_mmr(
+    retrieved_documents: list[RetrievalDoc],
+    relevances: np.ndarray,
+    doc_embeddings: np.ndarray,
+    mmr_lambda: float = 0.7,
+) -> list[RetrievalDoc]:
+    """
+    Orders docs by maximal marginal relevance. Doc scores are left as they were.
+    doc_embeddings are unit length rows, zero for docs without an embedding, so those docs are
+    never penalized as redundant. mmr_lambda 1 is pure relevance, 0 pure diversity.
+    """
+    if not retrieved_documents:
+        return []
+    similarities = doc_embeddings @ doc_embeddings.T
+    max_similarities = np.zeros(len(retrieved_documents), dtype=np.float32)
+    remaining = np.ones(len(retrieved_documents), dtype=bool)
+    selected: list[RetrievalDoc] = []
+    for _ in range(len(retrieved_documents)):
+        marginal_scores = mmr_lambda * relevances - (1 - mmr_lambda) * max_similarities
+        marginal_scores[~remaining] = -np.inf
+        best = int(np.argmax(marginal_scores))
+        selected.append(retrieved_documents[best])
+        remaining[best] = False
+        np.maximum(max_similarities, similarities[:, best], out=max_similarities)
+    return selected
@@ -20,6 +20,11 @@ def tiktoken_len(text: str, encoding_model="text-embedding-ada-002") -> int:
     return len(tokens)
 
 
+def get_encoding_name(encoding_model="text-embedding-ada-002") -> str:
+    """Token counts are stored by encoding, since many models share one."""
+    return tiktoken.encoding_for_model(encoding_model).name
+
+
 def tiktoken_len_of_document_list(texts: list[str]) -> int:
     token_count = 0
     for text in texts: